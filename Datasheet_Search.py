@@ -0,0 +1,233 @@
+"""
+Inverted index over datasheet file names for wire-name search.
+
+File names are normalized into tokens ("Production_Datasheet_12AWG_XLPE"
+-> production, datasheet, 12, awg, xlpe). Query keywords are looked up in
+the token postings directly, by prefix, or fuzzily through a character
+bigram index so typos such as "XPLE" still find "XLPE" files. Scores follow
+the original relevance rules: +10 per matched wire keyword, +5 per
+production keyword in the name, +20 for the whole wire name, plus a
+recency bonus that is computed once when the index is built.
+"""
+import bisect
+import heapq
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+SUPPORTED_MIME_TYPES = [
+    'application/vnd.google-apps.spreadsheet',
+    'application/vnd.google-apps.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-excel'
+]
+
+
+def normalize_name(text: str) -> str:
+    """Lower-case, drop punctuation and separate digits from letters ('12AWG' -> '12 awg')"""
+    text = re.sub(r'[\W_]+', ' ', text.lower())
+    text = re.sub(r'(?<=\d)(?=[^\W\d])|(?<=[^\W\d])(?=\d)', ' ', text)
+    return ' '.join(text.split())
+
+
+def _bigrams(token: str) -> Set[str]:
+    padded = f"^{token}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (counts a transposition as one edit), capped at limit + 1"""
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _recency_bonus(modified_time: str, now: datetime) -> int:
+    try:
+        modified_date = datetime.fromisoformat(modified_time.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return 0
+    days_old = (now - modified_date).days
+    if days_old <= 7:  # Last week
+        return 15
+    if days_old <= 30:  # Last month
+        return 10
+    if days_old <= 90:  # Last 3 months
+        return 5
+    return 0
+
+
+def file_url(file_id: str, mime_type: str) -> str:
+    """Browser URL for a Drive file"""
+    if 'spreadsheet' in mime_type:
+        return f"https://docs.google.com/spreadsheets/d/{file_id}"
+    return f"https://docs.google.com/document/d/{file_id}"
+
+
+class DatasheetSearchIndex:
+    """
+    Searchable snapshot of a folder listing
+
+    Args:
+        files: Folder listing as returned by Drive_Cache.FolderIndex
+        production_keywords: Keywords that mark a file as a production datasheet
+    """
+
+    def __init__(self, files: List[Dict], production_keywords: List[str]):
+        self.built_at = time.time()
+        now = datetime.now().astimezone()
+
+        self._files: List[Dict] = []
+        self._names: List[str] = []
+        self._static_scores: List[int] = []
+        self._static_keywords: List[List[str]] = []
+        postings: Dict[str, Set[int]] = defaultdict(set)
+
+        for file in files:
+            if file['mimeType'] not in SUPPORTED_MIME_TYPES:
+                continue
+            position = len(self._files)
+            file_name = file['name'].lower()
+            normalized = normalize_name(file['name'])
+
+            # Production keywords and recency do not depend on the query
+            keywords = [keyword for keyword in production_keywords if keyword in file_name]
+            self._static_keywords.append(keywords)
+            self._static_scores.append(5 * len(keywords) + _recency_bonus(file['modifiedTime'], now))
+
+            self._files.append(file)
+            self._names.append(f" {normalized} ")
+            for token in normalized.split():
+                postings[token].add(position)
+
+        self._postings = {token: sorted(positions) for token, positions in postings.items()}
+        self._vocabulary = sorted(self._postings)
+        self._bigram_tokens: Dict[str, List[str]] = defaultdict(list)
+        for token in self._vocabulary:
+            if not token.isdigit():
+                for bigram in _bigrams(token):
+                    self._bigram_tokens[bigram].append(token)
+
+        # Files that score without any keyword match, best first
+        self._static_ranking = sorted(
+            (position for position, score in enumerate(self._static_scores) if score > 0),
+            key=lambda position: -self._static_scores[position]
+        )
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _matching_tokens(self, keyword: str) -> Set[str]:
+        """Index tokens matching a query keyword exactly, by prefix or within a small edit distance"""
+        tokens = {keyword} if keyword in self._postings else set()
+
+        if len(keyword) >= 3:
+            start = bisect.bisect_left(self._vocabulary, keyword)
+            for token in self._vocabulary[start:]:
+                if not token.startswith(keyword):
+                    break
+                tokens.add(token)
+
+        if len(keyword) >= 4 and not keyword.isdigit():
+            max_distance = 1 if len(keyword) < 8 else 2
+            # A single edit changes at most three padded bigrams
+            min_shared = len(keyword) + 1 - 3 * max_distance
+            shared = defaultdict(int)
+            for bigram in _bigrams(keyword):
+                for token in self._bigram_tokens.get(bigram, ()):
+                    shared[token] += 1
+            for token, count in shared.items():
+                if (count >= min_shared and token not in tokens
+                        and abs(len(token) - len(keyword)) <= max_distance
+                        and _edit_distance(keyword, token, max_distance) <= max_distance):
+                    tokens.add(token)
+
+        return tokens
+
+    def _keyword_positions(self, keyword: str) -> Set[int]:
+        """Files whose name contains every token of a query keyword ('12awg' needs both '12' and 'awg')"""
+        positions: Optional[Set[int]] = None
+        for part in keyword.split():
+            part_positions = set()
+            for token in self._matching_tokens(part):
+                part_positions.update(self._postings[token])
+            positions = part_positions if positions is None else positions & part_positions
+            if not positions:
+                return set()
+        return positions or set()
+
+    def search(self, wire_name: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Score the indexed files against a wire name
+
+        Args:
+            wire_name: The name of the wire to search for
+            limit: Return only the best ``limit`` files (all matches when None)
+
+        Returns:
+            Matching files with relevance_score and matched_keywords, best first
+        """
+        raw_keywords = re.sub(r'[^\w\s-]', '', wire_name.lower()).split()
+        keywords = [normalize_name(keyword) for keyword in raw_keywords]
+        normalized_wire_name = f" {normalize_name(wire_name)} "
+
+        dynamic_scores: Dict[int, int] = defaultdict(int)
+        dynamic_keywords: Dict[int, List[str]] = defaultdict(list)
+        for raw_keyword, keyword in zip(raw_keywords, keywords):
+            if not keyword:
+                continue
+            for position in self._keyword_positions(keyword):
+                dynamic_scores[position] += 10
+                dynamic_keywords[position].append(raw_keyword)
+
+        if normalized_wire_name.strip():
+            for position in list(dynamic_scores):
+                if normalized_wire_name in self._names[position]:
+                    dynamic_scores[position] += 20
+
+        def score(position: int) -> int:
+            return self._static_scores[position] + dynamic_scores.get(position, 0)
+
+        # Ties keep the folder order (most recently modified first)
+        def rank(position: int) -> Tuple[int, int]:
+            return (-score(position), position)
+
+        if limit is None:
+            positions = set(dynamic_scores).union(self._static_ranking)
+            ranked = sorted(positions, key=rank)
+        else:
+            static_only = []
+            for position in self._static_ranking:
+                if position not in dynamic_scores:
+                    static_only.append(position)
+                    if len(static_only) >= limit:
+                        break
+            ranked = heapq.nsmallest(limit, list(dynamic_scores) + static_only, key=rank)
+
+        results = []
+        for position in ranked:
+            if score(position) <= 0:
+                continue
+            file = self._files[position]
+            results.append({
+                'id': file['id'],
+                'name': file['name'],
+                'mimeType': file['mimeType'],
+                'modifiedTime': file['modifiedTime'],
+                'relevance_score': score(position),
+                'matched_keywords': list(set(dynamic_keywords.get(position, []) + self._static_keywords[position])),
+                'url': file_url(file['id'], file['mimeType'])
+            })
+        return results
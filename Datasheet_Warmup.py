@@ -0,0 +1,162 @@
+"""
+Background warm-up of the extracted-datasheet cache.
+
+Every ``WARMUP_INTERVAL`` seconds the scheduler syncs the output folder
+listing and extracts the datasheets whose current version (id and
+modifiedTime) is not cached yet: first the best match for each of the
+most requested wire names, then the remaining new or changed files, most
+recently modified first. Request-time extraction then becomes a cache hit.
+Files the extractors cannot read are skipped, and a version that failed to
+extract is not retried until it changes (or WARMUP_FAILURE_RETRY passes).
+With several worker processes only the holder of a lease in the shared
+cache database runs the warm-up.
+"""
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from Datasheet_Search import file_url
+from Drive_Cache import (
+    acquire_lease,
+    get_extracted_cache,
+    get_folder_index,
+    popular_wire_names,
+    recent_extraction_failures,
+    record_extraction_failure
+)
+from Google_Client import background_calls, get_service
+from Google_Drive import (
+    EXTRACTABLE_MIME_TYPES,
+    OUTPUT_FOLDER_ID,
+    authenticate,
+    extract_datasheet_data,
+    search_production_datasheets_by_wire_name
+)
+from Metrics import set_endpoint
+
+# Seconds between warm-up rounds (0 disables the scheduler)
+WARMUP_INTERVAL = float(os.environ.get('DATASHEET_WARMUP_INTERVAL', '300'))
+# Most datasheets extracted in one round, to stay well inside the Sheets quota
+WARMUP_MAX_FILES = int(os.environ.get('DATASHEET_WARMUP_MAX_FILES', '50'))
+# Number of most requested wire names whose best match is warmed first
+WARMUP_TOP_WIRES = int(os.environ.get('DATASHEET_WARMUP_TOP_WIRES', '20'))
+# Seconds before a file version that failed to extract is tried again (transient errors)
+WARMUP_FAILURE_RETRY = float(os.environ.get('DATASHEET_WARMUP_FAILURE_RETRY', str(24 * 3600)))
+
+LEASE_NAME = 'datasheet-warmup'
+
+
+class WarmupScheduler:
+    """
+    Daemon thread that keeps the extracted-datasheet cache warm
+
+    Args:
+        interval: Seconds between rounds
+        max_files: Most datasheets extracted per round
+        top_wires: Number of popular wire names warmed first
+    """
+
+    def __init__(self, interval: float = WARMUP_INTERVAL, max_files: int = WARMUP_MAX_FILES,
+                 top_wires: int = WARMUP_TOP_WIRES):
+        self.interval = interval
+        self.max_files = max_files
+        self.top_wires = top_wires
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='datasheet-warmup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Google API calls and extractions of this thread are reported under endpoint="warmup"
+        set_endpoint('warmup')
+        while not self._stop.is_set():
+            try:
+                # The lease outlives a round so a slow round keeps it; a dead worker's lease expires
+                if acquire_lease(LEASE_NAME, self.owner, ttl=self.interval * 3):
+                    # Warm-up leaves part of the shared Google API quota to live requests
+                    with background_calls():
+                        self.run_once()
+            except Exception as e:
+                print(f"⚠️ Datasheet warm-up failed: {e}")
+            self._stop.wait(self.interval)
+
+    def pending_files(self, creds) -> List[Dict]:
+        """
+        Datasheets whose current version is not cached, in warm-up order
+
+        Returns:
+            Best matches of the most requested wire names first, then the other
+            new or changed files, most recently modified first. Unreadable file
+            types and versions that recently failed to extract are left out.
+        """
+        files = get_folder_index(OUTPUT_FOLDER_ID).get_files(get_service('drive', 'v3', creds))
+        cache = get_extracted_cache()
+        failed = recent_extraction_failures(WARMUP_FAILURE_RETRY)
+
+        ordered = []
+        for wire_name in popular_wire_names(self.top_wires):
+            ordered.extend(search_production_datasheets_by_wire_name(wire_name, creds, limit=1))
+        # The folder listing is already sorted newest first
+        ordered.extend(files)
+
+        pending = []
+        seen = set()
+        for file in ordered:
+            if file['id'] in seen:
+                continue
+            seen.add(file['id'])
+            if file['mimeType'] not in EXTRACTABLE_MIME_TYPES or (file['id'], file['modifiedTime']) in failed:
+                continue
+            if not cache.contains(file['id'], file['modifiedTime']):
+                pending.append(file)
+                if len(pending) >= self.max_files:
+                    break
+        return pending
+
+    def run_once(self) -> int:
+        """Run one warm-up round; returns the number of datasheets extracted"""
+        creds = authenticate()
+        pending = self.pending_files(creds)
+        if not pending:
+            return 0
+
+        print(f"🔥 Warming {len(pending)} datasheet(s)")
+        start = time.perf_counter()
+        warmed = 0
+        for file in pending:
+            if self._stop.is_set():
+                break
+            if 'url' not in file:
+                file = dict(file, url=file_url(file['id'], file['mimeType']))
+            if extract_datasheet_data(file, creds):
+                warmed += 1
+            else:
+                # Not retried every round; a new version of the file is tried again
+                record_extraction_failure(file['id'], file['modifiedTime'])
+        print(f"🔥 Warmed {warmed} datasheet(s) in {time.perf_counter() - start:.1f}s")
+        return warmed
+
+
+_scheduler: Optional[WarmupScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def start_warmup_scheduler() -> Optional[WarmupScheduler]:
+    """Start the process-wide warm-up scheduler unless it is disabled or already running"""
+    global _scheduler
+    if WARMUP_INTERVAL <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = WarmupScheduler()
+            _scheduler.start()
+            print(f"🔥 Datasheet warm-up every {WARMUP_INTERVAL:.0f}s (up to {WARMUP_MAX_FILES} files per round)")
+        return _scheduler
@@ -0,0 +1,711 @@
+"""
+Local on-disk cache for Google Drive data used by the datasheet services.
+
+Everything lives in one SQLite database (``DRIVE_CACHE_DB``, by default
+``drive_cache.sqlite3`` next to this file) so the cache survives restarts.
+When pyarrow is installed, the tabs of extracted datasheets (their cell
+text and parsed numbers) are stored next to it as Arrow IPC files
+(``DATASHEET_SNAPSHOT_DIR``) that are memory-mapped back instead of
+unpickled.
+"""
+import hashlib
+import os
+import pickle
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+from Metrics import CACHE_LOOKUPS, COALESCED_CALLS
+
+try:
+    import pyarrow as pa
+except ImportError:  # tabs are pickled with the rest of the datasheet instead
+    pa = None
+
+# Configuration
+DRIVE_CACHE_DB = os.environ.get(
+    'DRIVE_CACHE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drive_cache.sqlite3')
+)
+# Minimum number of seconds between two Changes API polls for a folder
+INDEX_SYNC_INTERVAL = float(os.environ.get('DRIVE_INDEX_SYNC_INTERVAL', '30'))
+# Budgets for extracted datasheets kept in memory and on disk. The memory cache is
+# per worker process (serve.py sets WEB_CONCURRENCY); the disk cache is shared by all
+DATASHEET_CACHE_MEMORY_MB = float(os.environ.get(
+    'DATASHEET_CACHE_MEMORY_MB', str(256 / max(1, int(os.environ.get('WEB_CONCURRENCY', '1'))))
+))
+DATASHEET_CACHE_DISK_MB = float(os.environ.get('DATASHEET_CACHE_DISK_MB', '2048'))
+# Arrow snapshots of extracted tabs, one directory per file version
+DATASHEET_SNAPSHOT_DIR = os.environ.get(
+    'DATASHEET_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(DRIVE_CACHE_DB)), 'datasheet_snapshots')
+)
+
+FOLDER_FILE_FIELDS = 'id, name, mimeType, modifiedTime, size'
+CHANGE_FIELDS = ('nextPageToken, newStartPageToken, '
+                 'changes(fileId, removed, file(id, name, mimeType, modifiedTime, size, parents, trashed))')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folder_files (
+    folder_id     TEXT NOT NULL,
+    id            TEXT NOT NULL,
+    name          TEXT NOT NULL,
+    mime_type     TEXT NOT NULL,
+    modified_time TEXT NOT NULL,
+    size          INTEGER,
+    PRIMARY KEY (folder_id, id)
+);
+CREATE INDEX IF NOT EXISTS folder_files_modified ON folder_files (folder_id, modified_time DESC);
+CREATE TABLE IF NOT EXISTS folder_sync (
+    folder_id  TEXT PRIMARY KEY,
+    page_token TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    synced_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extracted_datasheets (
+    file_id       TEXT PRIMARY KEY,
+    modified_time TEXT NOT NULL,
+    payload       BLOB NOT NULL,
+    size          INTEGER NOT NULL,
+    accessed_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extracted_datasheets_accessed ON extracted_datasheets (accessed_at);
+CREATE TABLE IF NOT EXISTS wire_requests (
+    wire_key       TEXT PRIMARY KEY,
+    wire_name      TEXT NOT NULL,
+    request_count  INTEGER NOT NULL,
+    last_requested REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extraction_failures (
+    file_id       TEXT PRIMARY KEY,
+    modified_time TEXT NOT NULL,
+    failed_at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    api        TEXT PRIMARY KEY,
+    tokens     REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection to the cache database"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DRIVE_CACHE_DB, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """Run a block inside a write transaction"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+
+
+class FolderIndex:
+    """
+    Local mirror of one Drive folder's listing.
+
+    The listing is bootstrapped once with ``files().list`` and then kept
+    current by applying ``changes().list`` deltas from a stored start page
+    token, at most once every ``sync_interval`` seconds.
+    """
+
+    def __init__(self, folder_id: str, sync_interval: float = INDEX_SYNC_INTERVAL):
+        self.folder_id = folder_id
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._files: List[Dict] = []
+        self._generation = -1
+        self._checked_at = 0.0
+
+    def get_files(self, drive_service) -> List[Dict]:
+        """
+        Return the files in the folder, most recently modified first
+
+        Args:
+            drive_service: Drive v3 service used to bootstrap or sync the index
+
+        Returns:
+            List of file dicts with id, name, mimeType, modifiedTime and size.
+            The list is shared and must not be modified by the caller.
+        """
+        with self._lock:
+            if self._generation < 0 or time.monotonic() - self._checked_at >= self.sync_interval:
+                self._sync(drive_service)
+                self._checked_at = time.monotonic()
+            return self._files
+
+    def _sync(self, drive_service):
+        conn = get_connection()
+        state = conn.execute(
+            'SELECT page_token, synced_at FROM folder_sync WHERE folder_id = ?', (self.folder_id,)
+        ).fetchone()
+
+        if state is None:
+            self._bootstrap(drive_service, conn)
+        elif time.time() - state[1] >= self.sync_interval:
+            try:
+                self._apply_changes(drive_service, conn, state[0])
+            except HttpError as e:
+                if e.resp.status not in (400, 404, 410):
+                    raise
+                print(f"⚠️ Stored page token for folder {self.folder_id} rejected ({e.resp.status}), rebuilding index")
+                self._bootstrap(drive_service, conn)
+
+        self._reload(conn)
+
+    def _bootstrap(self, drive_service, conn: sqlite3.Connection):
+        print(f"🗂️ Building local index for folder {self.folder_id}")
+
+        # Take the start token first so changes made during the listing are not lost
+        start_token = drive_service.changes().getStartPageToken(fields='startPageToken').execute()['startPageToken']
+
+        files = []
+        page_token = None
+        query = f"'{self.folder_id}' in parents and trashed = false"
+        while True:
+            results = drive_service.files().list(
+                q=query,
+                fields=f"nextPageToken, files({FOLDER_FILE_FIELDS})",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute()
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        with transaction(conn):
+            conn.execute('DELETE FROM folder_files WHERE folder_id = ?', (self.folder_id,))
+            conn.executemany(
+                'INSERT INTO folder_files VALUES (?, ?, ?, ?, ?, ?)',
+                [self._row(file) for file in files]
+            )
+            self._write_state(conn, start_token, bump=True)
+
+        print(f"🗂️ Indexed {len(files)} files in folder {self.folder_id}")
+
+    def _apply_changes(self, drive_service, conn: sqlite3.Connection, page_token: str):
+        changes, new_token = self._fetch_changes(drive_service, page_token)
+
+        upserts = []
+        removals = []
+        for change in changes:
+            file = change.get('file')
+            if (change.get('removed') or not file or file.get('trashed')
+                    or self.folder_id not in file.get('parents', [])):
+                removals.append((self.folder_id, change['fileId']))
+            else:
+                upserts.append(self._row(file))
+
+        with transaction(conn):
+            # Another worker may have applied the same delta while we were fetching it
+            current = conn.execute(
+                'SELECT page_token FROM folder_sync WHERE folder_id = ?', (self.folder_id,)
+            ).fetchone()
+            if current is None or current[0] != page_token:
+                return
+
+            conn.executemany('DELETE FROM folder_files WHERE folder_id = ? AND id = ?', removals)
+            conn.executemany('INSERT OR REPLACE INTO folder_files VALUES (?, ?, ?, ?, ?, ?)', upserts)
+            self._write_state(conn, new_token, bump=bool(changes))
+
+        if changes:
+            print(f"🔄 Applied {len(changes)} Drive changes to folder index {self.folder_id}")
+
+    def _fetch_changes(self, drive_service, page_token: str) -> Tuple[List[Dict], str]:
+        changes = []
+        while True:
+            results = drive_service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                includeRemoved=True,
+                pageSize=1000,
+                fields=CHANGE_FIELDS
+            ).execute()
+            changes.extend(results.get('changes', []))
+            if 'newStartPageToken' in results:
+                return changes, results['newStartPageToken']
+            page_token = results['nextPageToken']
+
+    def _write_state(self, conn: sqlite3.Connection, page_token: str, bump: bool):
+        conn.execute(
+            """
+            INSERT INTO folder_sync (folder_id, page_token, generation, synced_at) VALUES (?, ?, 1, ?)
+            ON CONFLICT (folder_id) DO UPDATE SET
+                page_token = excluded.page_token,
+                generation = generation + ?,
+                synced_at = excluded.synced_at
+            """,
+            (self.folder_id, page_token, time.time(), 1 if bump else 0)
+        )
+
+    def _reload(self, conn: sqlite3.Connection):
+        generation = conn.execute(
+            'SELECT generation FROM folder_sync WHERE folder_id = ?', (self.folder_id,)
+        ).fetchone()[0]
+        if generation == self._generation:
+            return
+
+        rows = conn.execute(
+            """
+            SELECT id, name, mime_type, modified_time, size FROM folder_files
+            WHERE folder_id = ? ORDER BY modified_time DESC
+            """,
+            (self.folder_id,)
+        ).fetchall()
+
+        files = []
+        for file_id, name, mime_type, modified_time, size in rows:
+            file = {'id': file_id, 'name': name, 'mimeType': mime_type, 'modifiedTime': modified_time}
+            if size is not None:
+                file['size'] = str(size)
+            files.append(file)
+
+        self._files = files
+        self._generation = generation
+
+    def _row(self, file: Dict) -> Tuple:
+        size = file.get('size')
+        return (self.folder_id, file['id'], file['name'], file['mimeType'], file['modifiedTime'],
+                int(size) if size is not None else None)
+
+
+_indexes: Dict[str, FolderIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_folder_index(folder_id: str) -> FolderIndex:
+    """Return the process-wide index for a Drive folder"""
+    with _indexes_lock:
+        index = _indexes.get(folder_id)
+        if index is None:
+            index = _indexes[folder_id] = FolderIndex(folder_id)
+        return index
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough in-memory size of an extracted datasheet in bytes"""
+    if hasattr(value, 'memory_usage'):  # pandas DataFrame
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return 64 + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(_estimate_size(v) for v in value)
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    return 32
+
+
+class _ArrowSnapshot:
+    """Stands in for a tab's DataFrame in a pickled datasheet whose tabs are stored as Arrow files"""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+
+def _snapshot_dir(file_id: str, modified_time: Optional[str] = None) -> str:
+    file_dir = os.path.join(DATASHEET_SNAPSHOT_DIR, re.sub(r'[^\w-]', '_', file_id))
+    if modified_time is None:
+        return file_dir
+    return os.path.join(file_dir, hashlib.sha1(modified_time.encode('utf-8')).hexdigest()[:16])
+
+
+# DataFrames of a tab written as Arrow files: the cell text and the parsed numbers
+SNAPSHOT_FRAMES = ('data', 'numeric')
+
+
+def _frame_table(key: str, df: pd.DataFrame) -> 'pa.Table':
+    """Arrow table of one of a tab's frames, built column by column because sheet headers may repeat"""
+    if key == 'numeric':
+        # Plain float64 arrays: NaN stays a value rather than a null, so reading back needs no copy
+        arrays = [pa.array(df.iloc[:, i].to_numpy(dtype='float64'), type=pa.float64()) for i in range(df.shape[1])]
+    else:
+        arrays = [pa.array(df.iloc[:, i], type=pa.string(), from_pandas=True) for i in range(df.shape[1])]
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in df.columns])
+
+
+def _frame_from_table(key: str, table: 'pa.Table') -> pd.DataFrame:
+    if key == 'numeric':
+        # One block per column, each a view of the mapped file
+        return table.to_pandas(split_blocks=True)
+    # Arrow-backed columns keep pointing into the mapped file instead of being copied
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _write_snapshots(file_id: str, modified_time: str, data: Dict) -> Tuple[Dict, int]:
+    """
+    Write the DataFrames of each tab (SNAPSHOT_FRAMES) to Arrow IPC files
+
+    Returns:
+        The datasheet with the written DataFrames replaced by _ArrowSnapshot
+        markers, and the number of bytes written
+    """
+    sheets = data.get('sheets') if pa is not None else None
+    if not sheets:
+        return data, 0
+
+    target = _snapshot_dir(file_id, modified_time)
+    staging = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(staging, exist_ok=True)
+
+    stored_sheets = {}
+    written = 0
+    for position, (title, sheet) in enumerate(sheets.items()):
+        stored_sheet = dict(sheet)
+        for key in SNAPSHOT_FRAMES:
+            df = sheet.get(key)
+            if not isinstance(df, pd.DataFrame):
+                continue
+            try:
+                table = _frame_table(key, df)
+            except (pa.ArrowException, TypeError, ValueError):
+                continue  # pickled as is
+            file_name = f"{position}.arrow" if key == 'data' else f"{position}.{key}.arrow"
+            with pa.OSFile(os.path.join(staging, file_name), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            written += os.path.getsize(os.path.join(staging, file_name))
+            stored_sheet[key] = _ArrowSnapshot(file_name)
+        stored_sheets[title] = stored_sheet
+
+    try:
+        os.rename(staging, target)
+    except OSError:  # another worker stored the same version first
+        shutil.rmtree(staging, ignore_errors=True)
+    return dict(data, sheets=stored_sheets), written
+
+
+def _read_snapshots(file_id: str, modified_time: str, data: Dict) -> Optional[Dict]:
+    """Memory-map the Arrow files of a datasheet back into DataFrames (None if one is gone)"""
+    sheets = data.get('sheets')
+    if not sheets or not any(isinstance(sheet.get(key), _ArrowSnapshot)
+                             for sheet in sheets.values() for key in SNAPSHOT_FRAMES):
+        return data
+    if pa is None:
+        return None
+
+    snapshot_dir = _snapshot_dir(file_id, modified_time)
+    loaded_sheets = {}
+    for title, sheet in sheets.items():
+        loaded_sheet = dict(sheet)
+        for key in SNAPSHOT_FRAMES:
+            snapshot = sheet.get(key)
+            if not isinstance(snapshot, _ArrowSnapshot):
+                continue
+            try:
+                source = pa.memory_map(os.path.join(snapshot_dir, snapshot.file_name))
+            except (FileNotFoundError, pa.ArrowIOError):
+                return None
+            loaded_sheet[key] = _frame_from_table(key, pa.ipc.open_file(source).read_all())
+        loaded_sheets[title] = loaded_sheet
+    return dict(data, sheets=loaded_sheets)
+
+
+def _remove_snapshots(file_id: str, keep: Optional[str] = None):
+    """Delete the Arrow files of every stored version of a file except ``keep``"""
+    file_dir = _snapshot_dir(file_id)
+    if not os.path.isdir(file_dir):
+        return
+    if keep is None:
+        shutil.rmtree(file_dir, ignore_errors=True)
+        return
+    keep_dir = os.path.basename(_snapshot_dir(file_id, keep))
+    for entry in os.listdir(file_dir):
+        if entry != keep_dir and not entry.endswith('.tmp'):
+            shutil.rmtree(os.path.join(file_dir, entry), ignore_errors=True)
+
+
+class ExtractedDataCache:
+    """
+    Cache of extracted datasheets keyed on (file_id, modifiedTime).
+
+    Recently used entries are kept in memory up to ``memory_budget`` bytes
+    and evicted least-recently-used first. Every entry is also written to
+    the SQLite store (tabs as Arrow snapshots when available), trimmed to
+    ``disk_budget`` bytes, so the cache survives process restarts and is
+    shared by worker processes. Only the latest version of a file is kept.
+    """
+
+    def __init__(self, memory_budget: int, disk_budget: int):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[Dict, int]]' = OrderedDict()
+        self._memory_used = 0
+
+    def get(self, file_id: str, modified_time: str, count: bool = True) -> Optional[Dict]:
+        """
+        Return the cached extraction for this file version, or None
+
+        ``count=False`` leaves the hit / miss metrics alone, for re-checks
+        of a lookup that has already been counted.
+        """
+        def record(tier: str, result: str):
+            if count:
+                CACHE_LOOKUPS.inc(tier=tier, result=result)
+
+        key = (file_id, modified_time)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                record('memory', 'hit')
+                return entry[0]
+        record('memory', 'miss')
+
+        conn = get_connection()
+        row = conn.execute(
+            'SELECT payload FROM extracted_datasheets WHERE file_id = ? AND modified_time = ?',
+            (file_id, modified_time)
+        ).fetchone()
+        if row is None:
+            record('disk', 'miss')
+            return None
+
+        data = _read_snapshots(file_id, modified_time, pickle.loads(row[0]))
+        if data is None:
+            record('disk', 'miss')
+            return None
+        record('disk', 'hit')
+        conn.execute('UPDATE extracted_datasheets SET accessed_at = ? WHERE file_id = ?', (time.time(), file_id))
+        self._remember(key, data)
+        return data
+
+    def contains(self, file_id: str, modified_time: str) -> bool:
+        """Check whether this file version is cached, without loading it"""
+        with self._lock:
+            if (file_id, modified_time) in self._entries:
+                return True
+        return get_connection().execute(
+            'SELECT 1 FROM extracted_datasheets WHERE file_id = ? AND modified_time = ?',
+            (file_id, modified_time)
+        ).fetchone() is not None
+
+    def clear(self):
+        """Drop every cached datasheet from memory and disk"""
+        with self._lock:
+            self._entries.clear()
+            self._memory_used = 0
+        conn = get_connection()
+        with transaction(conn):
+            file_ids = [row[0] for row in conn.execute('SELECT file_id FROM extracted_datasheets')]
+            conn.execute('DELETE FROM extracted_datasheets')
+        for file_id in file_ids:
+            _remove_snapshots(file_id)
+
+    def put(self, file_id: str, modified_time: str, data: Dict):
+        """Store the extraction for this file version, replacing older versions"""
+        self._remember((file_id, modified_time), data)
+
+        stored_data, snapshot_size = _write_snapshots(file_id, modified_time, data)
+        payload = pickle.dumps(stored_data, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = get_connection()
+        with transaction(conn):
+            conn.execute(
+                'INSERT OR REPLACE INTO extracted_datasheets VALUES (?, ?, ?, ?, ?)',
+                (file_id, modified_time, payload, len(payload) + snapshot_size, time.time())
+            )
+            trimmed = self._trim_disk(conn)
+        _remove_snapshots(file_id, keep=modified_time)
+        for trimmed_id in trimmed:
+            _remove_snapshots(trimmed_id)
+
+    def _remember(self, key: Tuple[str, str], data: Dict):
+        size = _estimate_size(data)
+        with self._lock:
+            for old_key in [k for k in self._entries if k[0] == key[0]]:
+                self._memory_used -= self._entries.pop(old_key)[1]
+
+            if size > self.memory_budget:
+                return
+            self._entries[key] = (data, size)
+            self._memory_used += size
+
+            while self._memory_used > self.memory_budget:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory_used -= evicted_size
+
+    def _trim_disk(self, conn: sqlite3.Connection) -> List[str]:
+        """Delete least recently used rows over the disk budget; returns their file ids"""
+        trimmed = []
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM extracted_datasheets').fetchone()[0]
+        if total <= self.disk_budget:
+            return trimmed
+
+        for file_id, size in conn.execute(
+            'SELECT file_id, size FROM extracted_datasheets ORDER BY accessed_at'
+        ).fetchall():
+            conn.execute('DELETE FROM extracted_datasheets WHERE file_id = ?', (file_id,))
+            trimmed.append(file_id)
+            total -= size
+            if total <= self.disk_budget:
+                break
+        return trimmed
+
+
+_extracted_cache: Optional[ExtractedDataCache] = None
+_extracted_cache_lock = threading.Lock()
+
+
+def get_extracted_cache() -> ExtractedDataCache:
+    """Return the process-wide cache of extracted datasheets"""
+    global _extracted_cache
+    with _extracted_cache_lock:
+        if _extracted_cache is None:
+            _extracted_cache = ExtractedDataCache(
+                memory_budget=int(DATASHEET_CACHE_MEMORY_MB * 1024 * 1024),
+                disk_budget=int(DATASHEET_CACHE_DISK_MB * 1024 * 1024)
+            )
+        return _extracted_cache
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers that arrive while
+    it is still running wait for it and receive the same result (or the same
+    exception) instead of repeating the Google API work. Joined calls are
+    counted in ``single_flight_coalesced_total{flight=<name>}``.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            COALESCED_CALLS.inc(flight=self.name)
+            print(f"🔁 Joining in-flight {self.name} for {key}")
+            return call.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def record_wire_request(wire_key: str, wire_name: str):
+    """Count a client request for a wire (``wire_key`` is the normalized name)"""
+    conn = get_connection()
+    conn.execute(
+        'INSERT INTO wire_requests VALUES (?, ?, 1, ?) '
+        'ON CONFLICT (wire_key) DO UPDATE SET wire_name = excluded.wire_name, '
+        'request_count = request_count + 1, last_requested = excluded.last_requested',
+        (wire_key, wire_name, time.time())
+    )
+
+
+def popular_wire_names(limit: int, max_age: float = 30 * 24 * 3600) -> List[str]:
+    """Most requested wire names of the last ``max_age`` seconds, most requested first"""
+    rows = get_connection().execute(
+        'SELECT wire_name FROM wire_requests WHERE last_requested >= ? '
+        'ORDER BY request_count DESC, last_requested DESC LIMIT ?',
+        (time.time() - max_age, limit)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def record_extraction_failure(file_id: str, modified_time: str):
+    """Remember that this version of a file could not be extracted"""
+    get_connection().execute(
+        'INSERT OR REPLACE INTO extraction_failures VALUES (?, ?, ?)',
+        (file_id, modified_time, time.time())
+    )
+
+
+def recent_extraction_failures(max_age: float) -> Set[Tuple[str, str]]:
+    """(file_id, modifiedTime) of the versions that failed to extract in the last ``max_age`` seconds"""
+    rows = get_connection().execute(
+        'SELECT file_id, modified_time FROM extraction_failures WHERE failed_at >= ?',
+        (time.time() - max_age,)
+    ).fetchall()
+    return {(row[0], row[1]) for row in rows}
+
+
+def acquire_lease(name: str, owner: str, ttl: float) -> bool:
+    """
+    Take or renew a named lease shared by all worker processes
+
+    Returns:
+        True if ``owner`` holds the lease for the next ``ttl`` seconds
+    """
+    conn = get_connection()
+    now = time.time()
+    with transaction(conn):
+        row = conn.execute('SELECT owner, expires_at FROM leases WHERE name = ?', (name,)).fetchone()
+        if row is not None and row[0] != owner and row[1] > now:
+            return False
+        conn.execute('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)', (name, owner, now + ttl))
+    return True
+
+
+def take_rate_limit_token(api: str, capacity: float, rate: float,
+                          floor: Optional[float] = None) -> Tuple[bool, float]:
+    """
+    Take one token from an API's rate-limit bucket shared by every process using this database
+
+    The bucket refills at ``rate`` tokens per second up to ``capacity``. A
+    token is always taken, even if that drives the bucket negative, and the
+    caller waits until it is due; waiting callers are thus served in order.
+    With ``floor`` the token is taken only if at least ``floor`` tokens are
+    left afterwards, so such callers never eat into that reserve.
+
+    Returns:
+        (whether a token was taken, seconds to wait before using it or trying again)
+    """
+    conn = get_connection()
+    now = time.time()
+    with transaction(conn):
+        row = conn.execute('SELECT tokens, updated_at FROM rate_limits WHERE api = ?', (api,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+        if floor is not None and tokens - 1 < floor:
+            return False, (floor + 1 - tokens) / rate
+        tokens -= 1
+        conn.execute('INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?)', (api, tokens, now))
+    return True, -tokens / rate if tokens < 0 else 0.0
@@ -1,16 +1,18 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
 import pandas as pd
+import numpy as np
+import contextvars
 import os
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-
-# Scopes for Drive and Sheets
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly',
-          'https://www.googleapis.com/auth/spreadsheets.readonly']
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from Datasheet_Search import SUPPORTED_MIME_TYPES, DatasheetSearchIndex, file_url, normalize_name
+from Drive_Cache import SingleFlight, get_extracted_cache, get_folder_index, record_wire_request
+from Google_Client import SPREADSHEET_GRID_FIELDS, get_credentials, get_service, read_sheet_values
+from Metrics import time_stage
 
 # Configuration
 OUTPUT_FOLDER_ID = '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN'  # Your output folder ID
@@ -18,118 +20,93 @@ PRODUCTION_DATASHEET_KEYWORDS = [
     'production', 'datasheet', 'specification', 'technical', 'data sheet',
     'wire', 'cable', 'conductor', 'insulation', 'jacket'
 ]
+# Datasheet row labels to look for, in priority order, for each report field
+FIELD_MAPPINGS = {
+    'itemDescription': ['Product Name', 'Wire Name', 'Cable Type', 'Description', 'Item Description'],
+    'conductor': ['Conductor Type', 'Conductor Material', 'Material'],
+    'insulation': ['Insulation Type', 'Insulation Material', 'Insulation'],
+    'voltage': ['Voltage Rating', 'Rated Voltage', 'Voltage'],
+    'temperature': ['Temperature Rating', 'Operating Temperature', 'Temp Rating'],
+    'standards': ['Standards', 'Reference Standard', 'Standard'],
+    'awg_size': ['AWG Size', 'Conductor Size', 'Size', 'Gauge']
+}
+# Report keys filled by each report field
+REPORT_FIELD_KEYS = {
+    'itemDescription': 'itemDescription',
+    'conductor': 'conductor_type',
+    'insulation': 'insulation_type',
+    'voltage': 'voltage_rating',
+    'temperature': 'temperature_rating',
+    'standards': 'referenceStandard',
+    'awg_size': 'awg_size'
+}
+# Report fields a candidate datasheet must provide when several are extracted concurrently
+REQUIRED_REPORT_FIELDS = ['conductor', 'insulation', 'voltage']
+# Types the extractors can read: native Google Sheets and Docs. Uploaded Excel files are
+# found by search (SUPPORTED_MIME_TYPES) but neither the Sheets nor the Docs API reads them.
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+DOCUMENT_MIME_TYPE = 'application/vnd.google-apps.document'
+EXTRACTABLE_MIME_TYPES = [SPREADSHEET_MIME_TYPE, DOCUMENT_MIME_TYPE]
+# Upper bound on concurrent datasheet extractions across all requests
+EXTRACTION_MAX_WORKERS = int(os.environ.get('DATASHEET_EXTRACTION_WORKERS', '4'))
+# Most extractions a single batch request queues on that pool at a time
+BATCH_EXTRACTION_WINDOW = int(os.environ.get('BATCH_EXTRACTION_WINDOW', str(EXTRACTION_MAX_WORKERS)))
+# Rebuild the search index at least this often so recency bonuses stay current
+SEARCH_INDEX_MAX_AGE = 3600
+
+_search_index: Optional[DatasheetSearchIndex] = None
+_search_index_files: Optional[List[Dict]] = None
+_search_index_lock = threading.Lock()
+_extraction_pool = ThreadPoolExecutor(max_workers=EXTRACTION_MAX_WORKERS, thread_name_prefix='extract')
+# Concurrent identical requests share one extraction / lookup
+_extraction_flights = SingleFlight('extraction')
+_lookup_flights = SingleFlight('datasheet lookup')
 
 def authenticate():
-    """Authenticate with Google Drive API"""
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    """Authenticate with Google Drive API (credentials are cached and refreshed in the background)"""
+    return get_credentials()
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('Paras_credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
+def _get_search_index(files: List[Dict]) -> DatasheetSearchIndex:
+    """Return the search index for the current folder listing, rebuilding it when stale"""
+    global _search_index, _search_index_files
+    with _search_index_lock:
+        if (_search_index is None or _search_index_files is not files
+                or time.time() - _search_index.built_at > SEARCH_INDEX_MAX_AGE):
+            _search_index = DatasheetSearchIndex(files, PRODUCTION_DATASHEET_KEYWORDS)
+            _search_index_files = files
+        return _search_index
 
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    
-    return creds
+def track_wire_request(wire_name: str):
+    """Count a client request for a wire so the warm-up scheduler can prioritize its datasheet"""
+    try:
+        record_wire_request(normalize_name(wire_name), wire_name)
+    except Exception as e:
+        print(f"⚠️ Failed to record request for wire '{wire_name}': {e}")
 
-def search_production_datasheets_by_wire_name(wire_name: str, creds) -> List[Dict]:
+def search_production_datasheets_by_wire_name(wire_name: str, creds, limit: Optional[int] = None) -> List[Dict]:
     """
     Search for production datasheets in the output folder based on wire name
     
     Args:
         wire_name: The name of the wire to search for
         creds: Google credentials
+        limit: Return only the best ``limit`` datasheets (all matches when None)
     
     Returns:
         List of matching datasheet files with metadata
     """
-    drive_service = build('drive', 'v3', credentials=creds)
-    
-    # Clean and normalize wire name for search
-    normalized_wire_name = re.sub(r'[^\w\s-]', '', wire_name.lower()).strip()
-    wire_keywords = normalized_wire_name.split()
+    drive_service = get_service('drive', 'v3', creds)
     
     print(f"🔍 Searching for datasheets matching wire: '{wire_name}'")
-    print(f"📝 Normalized keywords: {wire_keywords}")
-    
-    # Search in the output folder
-    query = f"'{OUTPUT_FOLDER_ID}' in parents and trashed = false"
-    results = drive_service.files().list(
-        q=query, 
-        fields="files(id, name, mimeType, modifiedTime, size)",
-        orderBy="modifiedTime desc"
-    ).execute()
+    print(f"📝 Normalized keywords: {normalize_name(wire_name).split()}")
     
-    files = results.get('files', [])
+    # Search the local index of the output folder (synced through the Changes API)
+    with time_stage('folder_index'):
+        files = get_folder_index(OUTPUT_FOLDER_ID).get_files(drive_service)
     print(f"📁 Found {len(files)} files in output folder")
     
-    matching_files = []
-    
-    for file in files:
-        file_name = file['name'].lower()
-        file_id = file['id']
-        modified_time = file['modifiedTime']
-        
-        # Check if file is a spreadsheet or document
-        if file['mimeType'] not in [
-            'application/vnd.google-apps.spreadsheet',
-            'application/vnd.google-apps.document',
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'application/vnd.ms-excel'
-        ]:
-            continue
-        
-        # Score the file based on relevance
-        relevance_score = 0
-        matched_keywords = []
-        
-        # Check for wire name keywords
-        for keyword in wire_keywords:
-            if keyword in file_name:
-                relevance_score += 10
-                matched_keywords.append(keyword)
-        
-        # Check for production datasheet keywords
-        for keyword in PRODUCTION_DATASHEET_KEYWORDS:
-            if keyword in file_name:
-                relevance_score += 5
-                matched_keywords.append(keyword)
-        
-        # Bonus for exact wire name match
-        if normalized_wire_name in file_name:
-            relevance_score += 20
-        
-        # Bonus for recent modifications
-        try:
-            modified_date = datetime.fromisoformat(modified_time.replace('Z', '+00:00'))
-            days_old = (datetime.now().astimezone() - modified_date).days
-            if days_old <= 7:  # Last week
-                relevance_score += 15
-            elif days_old <= 30:  # Last month
-                relevance_score += 10
-            elif days_old <= 90:  # Last 3 months
-                relevance_score += 5
-        except:
-            pass
-        
-        if relevance_score > 0:
-            matching_files.append({
-                'id': file_id,
-                'name': file['name'],
-                'mimeType': file['mimeType'],
-                'modifiedTime': modified_time,
-                'relevance_score': relevance_score,
-                'matched_keywords': list(set(matched_keywords)),
-                'url': f"https://docs.google.com/spreadsheets/d/{file_id}" if 'spreadsheet' in file['mimeType'] else f"https://docs.google.com/document/d/{file_id}"
-            })
-    
-    # Sort by relevance score (highest first)
-    matching_files.sort(key=lambda x: x['relevance_score'], reverse=True)
+    with time_stage('search'):
+        matching_files = _get_search_index(files).search(wire_name, limit)
     
     print(f"🎯 Found {len(matching_files)} relevant datasheets")
     for file in matching_files[:5]:  # Show top 5
@@ -148,24 +125,56 @@ def extract_datasheet_data(file_info: Dict, creds) -> Optional[Dict]:
     Returns:
         Extracted data or None if failed
     """
+    # Unchanged files are served from the cache without any Google API call
+    cache = get_extracted_cache()
+    with time_stage('cache_get'):
+        cached_data = cache.get(file_info['id'], file_info['modifiedTime'])
+    if cached_data is not None:
+        print(f"⚡ Using cached data for {file_info['name']} ({file_info['modifiedTime']})")
+        return cached_data
+    
+    return _extraction_flights.do((file_info['id'], file_info['modifiedTime']), _extract_and_cache, file_info, creds)
+
+def _extract_and_cache(file_info: Dict, creds) -> Optional[Dict]:
+    # A flight that finished just before this one started has already cached the data
+    # (not counted again: extract_datasheet_data has recorded this lookup's miss)
+    cached_data = get_extracted_cache().get(file_info['id'], file_info['modifiedTime'], count=False)
+    if cached_data is not None:
+        return cached_data
+    
+    if file_info['mimeType'] not in EXTRACTABLE_MIME_TYPES:
+        print(f"❌ Cannot extract {file_info['name']}: unsupported file type {file_info['mimeType']}")
+        return None
+    
     try:
-        if 'spreadsheet' in file_info['mimeType']:
-            return extract_spreadsheet_data(file_info, creds)
+        if file_info['mimeType'] == SPREADSHEET_MIME_TYPE:
+            with time_stage('extract_spreadsheet'):
+                datasheet_data = extract_spreadsheet_data(file_info, creds)
         else:
-            return extract_document_data(file_info, creds)
+            with time_stage('extract_document'):
+                datasheet_data = extract_document_data(file_info, creds)
     except Exception as e:
         print(f"❌ Failed to extract data from {file_info['name']}: {e}")
         return None
+    
+    if datasheet_data:
+        with time_stage('cache_put'):
+            get_extracted_cache().put(file_info['id'], file_info['modifiedTime'], datasheet_data)
+    return datasheet_data
 
 def extract_spreadsheet_data(file_info: Dict, creds) -> Dict:
     """Extract data from Google Spreadsheet"""
-    sheets_service = build('sheets', 'v4', credentials=creds)
+    sheets_service = get_service('sheets', 'v4', creds)
     spreadsheet_id = file_info['id']
     
     print(f"📊 Extracting data from spreadsheet: {file_info['name']}")
     
-    # Get spreadsheet info
-            spreadsheet = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    # Get the tab titles and grid sizes only
+    with time_stage('spreadsheet_metadata'):
+        spreadsheet = sheets_service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields=SPREADSHEET_GRID_FIELDS
+        ).execute()
     
     extracted_data = {
         'file_name': file_info['name'],
@@ -175,26 +184,23 @@ def extract_spreadsheet_data(file_info: Dict, creds) -> Dict:
         'sheets': {},
         'summary': {}
     }
-            
-            for sheet in spreadsheet['sheets']:
-                sheet_title = sheet['properties']['title']
+    
+    # Read every tab's grid, batched within the per-call cell budget
+    sheet_titles = [sheet['properties']['title'] for sheet in spreadsheet['sheets']]
+    with time_stage('read_values'):
+        sheet_values = read_sheet_values(sheets_service, spreadsheet_id, spreadsheet['sheets'])
+    
+    for sheet_title, values in zip(sheet_titles, sheet_values):
         print(f"   ➤ Processing sheet: {sheet_title}")
-                
+        
         try:
-            # Read sheet data
-                range_name = f"{sheet_title}!A:Z"
-                result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name
-                ).execute()
-
-                values = result.get('values', [])
-                if not values:
-                    continue
-
-                header = values[0]
-                data_rows = values[1:]
-
+            if not values:
+                continue
+            
+            header = values[0]
+            data_rows = values[1:]
+            
+            with time_stage('build_frame'):
                 # Normalize rows
                 normalized_data = []
                 for row in data_rows:
@@ -202,19 +208,25 @@ def extract_spreadsheet_data(file_info: Dict, creds) -> Dict:
                     normalized_row = normalized_row[:len(header)]
                     normalized_data.append(normalized_row)
                 
-            # Create DataFrame
+                # Create DataFrame
                 df = pd.DataFrame(normalized_data, columns=header)
             
+            # Parse numbers once; comparisons use the typed frame instead of re-parsing the text
+            with time_stage('parse_cells'):
+                parsed = parse_cells(df)
+            
             # Store sheet data
             extracted_data['sheets'][sheet_title] = {
                 'data': df,
+                'numeric': parsed.value,
                 'row_count': len(df),
                 'column_count': len(df.columns),
                 'headers': header
             }
             
             # Extract key information
-            extracted_data['summary'][sheet_title] = extract_key_information(df, sheet_title)
+            with time_stage('summarize'):
+                extracted_data['summary'][sheet_title] = extract_key_information(df, sheet_title, parsed)
         
         except Exception as e:
             print(f"      ❌ Failed to process sheet {sheet_title}: {e}")
@@ -223,13 +235,18 @@ def extract_spreadsheet_data(file_info: Dict, creds) -> Dict:
 
 def extract_document_data(file_info: Dict, creds) -> Dict:
     """Extract data from Google Document"""
-    docs_service = build('docs', 'v1', credentials=creds)
+    docs_service = get_service('docs', 'v1', creds)
     document_id = file_info['id']
     
     print(f"📄 Extracting data from document: {file_info['name']}")
     
     try:
-        document = docs_service.documents().get(documentId=document_id).execute()
+        # Only the text runs, none of the styling
+        with time_stage('document_read'):
+            document = docs_service.documents().get(
+                documentId=document_id,
+                fields='body.content.paragraph.elements.textRun.content'
+            ).execute()
         
         # Extract text content
         content = document.get('body', {}).get('content', [])
@@ -237,7 +254,7 @@ def extract_document_data(file_info: Dict, creds) -> Dict:
         
         for element in content:
             if 'paragraph' in element:
-                for para_element in element['paragraph']['elements']:
+                for para_element in element['paragraph'].get('elements', []):
                     if 'textRun' in para_element:
                         text_content.append(para_element['textRun']['content'])
         
@@ -257,8 +274,74 @@ def extract_document_data(file_info: Dict, creds) -> Dict:
         print(f"❌ Failed to extract document data: {e}")
         return None
 
-def extract_key_information(df: pd.DataFrame, sheet_name: str) -> Dict:
-    """Extract key information from a sheet"""
+# A cell holding a number or a range, optionally followed by a unit ("600 V", "-40 to +85", "1,200 kg/km")
+_NUMBER = r'[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|[-+]?\.\d+'
+_NUMERIC_CELL = (rf'^\s*(?P<low>{_NUMBER})\s*(?:(?:to|TO|To|-|–|~)\s*(?P<high>{_NUMBER}))?'
+                 r'\s*(?P<unit>[^\W\d_][\w°%µΩ²³/·.]*(?: [^\W\d_][\w°%µΩ²³/·.]*)?|[°%µΩ][\w°%µΩ²³/·.]*)?\s*$')
+# A cell holding only a unit of measure
+_UNIT_CELL = (r'^\s*(?:[kMmµu]?(?:V|A|W|Hz|Ω|ohms?)(?:\s*/\s*k?m)?|[kcmµu]?m[²³23]?|kg(?:/k?m)?|g/m|'
+              r'°[CF]|%|AWG|kcmil|[kM]?Pa|k?N|MΩ\s*[·.]?\s*km|[pn]F/m|dB|mm/s|years?|h)\s*$')
+# Share of a column's non-empty cells that must be numeric (or units) to type the column
+COLUMN_TYPE_THRESHOLD = 0.8
+
+class ParsedCells(NamedTuple):
+    """Every cell of a sheet classified in one pass (arrays are aligned with the sheet)"""
+    value: pd.DataFrame   # plain numbers, NaN for text and ranges
+    low: np.ndarray       # lower bound of numbers and ranges, NaN for text
+    high: np.ndarray      # upper bound of numbers and ranges, NaN for text
+    filled: np.ndarray    # cell is not blank
+    is_unit: np.ndarray   # cell holds only a unit of measure
+
+def parse_cells(df: pd.DataFrame) -> ParsedCells:
+    """
+    Parse every cell of a sheet as a number, range or unit in one vectorized pass
+    
+    Distinct cell texts are parsed once (sheets repeat most of their values),
+    with regex match / replace and casts that run natively on Arrow-backed
+    strings, then broadcast back to the sheet's shape.
+    """
+    codes, uniques = pd.factorize(pd.Series(df.to_numpy(dtype=object).ravel(), dtype=object).fillna(''))
+    cells = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    is_numeric = cells.str.match(_NUMERIC_CELL).to_numpy(dtype=bool)
+    numeric_cells = cells[is_numeric]
+    
+    def bound(group: str) -> np.ndarray:
+        text = numeric_cells.str.replace(_NUMERIC_CELL, group, regex=True).str.replace(',', '', regex=False)
+        values = np.full(len(cells), np.nan)
+        values[is_numeric] = text.where(text != '').astype('float64').to_numpy(dtype=float, na_value=np.nan)
+        return values
+    
+    low = bound(r'\1')
+    high = bound(r'\2')
+    is_range = ~np.isnan(high)
+    value = np.where(is_range, np.nan, low)
+    high = np.where(is_range, high, low)
+    filled = (cells != '').to_numpy(dtype=bool)
+    is_unit = cells.str.match(_UNIT_CELL, flags=re.IGNORECASE).to_numpy(dtype=bool)
+    
+    def broadcast(unique_values: np.ndarray) -> np.ndarray:
+        return unique_values[codes].reshape(df.shape)
+    return ParsedCells(
+        value=pd.DataFrame(broadcast(value), index=df.index, columns=df.columns),
+        low=broadcast(low),
+        high=broadcast(high),
+        filled=broadcast(filled),
+        is_unit=broadcast(is_unit)
+    )
+
+def extract_key_information(df: pd.DataFrame, sheet_name: str, parsed: Optional[ParsedCells] = None) -> Dict:
+    """
+    Extract key information from a sheet
+    
+    Args:
+        df: Sheet data (formatted cell text)
+        sheet_name: Title of the sheet
+        parsed: Result of parse_cells(df) if already computed
+    
+    Returns:
+        JSON-safe summary with the numeric columns, unit columns, numeric
+        ranges and a numeric / text type per column
+    """
     summary = {
         'row_count': len(df),
         'column_count': len(df.columns),
@@ -271,12 +354,6 @@ def extract_key_information(df: pd.DataFrame, sheet_name: str) -> Dict:
     if len(df) == 0:
         return summary
     
-    # Check for numeric data
-    numeric_columns = df.select_dtypes(include=['number']).columns
-    if len(numeric_columns) > 0:
-        summary['has_numeric_data'] = True
-        summary['numeric_columns'] = list(numeric_columns)
-    
     # Check for specification-related fields
     spec_keywords = ['spec', 'parameter', 'value', 'unit', 'requirement', 'standard']
     for col in df.columns:
@@ -285,39 +362,140 @@ def extract_key_information(df: pd.DataFrame, sheet_name: str) -> Dict:
             summary['has_specifications'] = True
             summary['key_fields'].append(col)
     
-    # Analyze data types
-    for col in df.columns:
-        col_data = df[col].dropna()
-        if len(col_data) > 0:
-            # Check if column contains numeric data
-            try:
-                pd.to_numeric(col_data.iloc[:10])  # Check first 10 values
-                summary['data_types'][col] = 'numeric'
-            except:
-                summary['data_types'][col] = 'text'
+    if parsed is None:
+        parsed = parse_cells(df)
+    numeric = ~np.isnan(parsed.low)
+    filled_counts = parsed.filled.sum(axis=0)
+    numeric_share = numeric.sum(axis=0) / filled_counts.clip(min=1)
+    unit_share = parsed.is_unit.sum(axis=0) / filled_counts.clip(min=1)
+    with np.errstate(all='ignore'):
+        column_low = np.nanmin(np.where(numeric, parsed.low, np.inf), axis=0)
+        column_high = np.nanmax(np.where(numeric, parsed.high, -np.inf), axis=0)
+    
+    numeric_columns = []
+    unit_columns = []
+    numeric_ranges = {}
+    for position, col in enumerate(df.columns):
+        if filled_counts[position] == 0:
+            continue
+        if numeric_share[position] >= COLUMN_TYPE_THRESHOLD:
+            summary['data_types'][col] = 'numeric'
+            numeric_columns.append(col)
+            numeric_ranges[col] = {'min': float(column_low[position]), 'max': float(column_high[position])}
+        else:
+            summary['data_types'][col] = 'text'
+        if 'unit' in str(col).lower() or unit_share[position] >= COLUMN_TYPE_THRESHOLD:
+            unit_columns.append(col)
+    
+    if numeric_columns:
+        summary['has_numeric_data'] = True
+        summary['numeric_columns'] = numeric_columns
+        summary['numeric_ranges'] = numeric_ranges
+    if unit_columns:
+        summary['unit_columns'] = unit_columns
+    # Label / value sheets keep their numbers in a mostly-text value column
+    summary['numeric_cells'] = int(numeric.sum())
     
     return summary
 
-def get_latest_production_datasheet(wire_name: str, creds) -> Optional[Dict]:
+def datasheet_has_fields(datasheet_data: Dict, report_fields: List[str]) -> bool:
+    """Check whether a datasheet provides a value for every one of the report fields"""
+    missing = list(report_fields)
+    for sheet_data in datasheet_data.get('sheets', {}).values():
+        if not missing:
+            break
+        if sheet_data.get('data') is not None:
+            found = match_report_fields(sheet_data['data'], missing)
+            missing = [field for field in missing if field not in found]
+    return not missing
+
+def _submit_extraction(file_info: Dict, creds) -> Future:
+    """Queue a datasheet extraction on the shared pool"""
+    # Runs in a copy of this context so its metrics keep the request's endpoint label
+    return _extraction_pool.submit(contextvars.copy_context().run, extract_datasheet_data, file_info, creds)
+
+def _extract_first_satisfying(candidates: List[Dict], creds, deadline: Optional[float],
+                              required_fields: List[str]) -> Optional[Dict]:
+    """
+    Extract candidate datasheets concurrently and return the first with the required fields
+    
+    Candidates still queued when a result is accepted are cancelled; ones
+    already running finish in the background and land in the cache. If no
+    candidate satisfies the required fields before the deadline, the best
+    ranked datasheet extracted so far is returned.
+    """
+    futures = {_submit_extraction(file_info, creds): rank for rank, file_info in enumerate(candidates)}
+    extracted: Dict[int, Dict] = {}
+    
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            rank = futures[future]
+            try:
+                datasheet_data = future.result()
+            except Exception as e:
+                print(f"❌ Failed to extract candidate {candidates[rank]['name']}: {e}")
+                continue
+            if not datasheet_data:
+                continue
+            with time_stage('check_required_fields'):
+                satisfied = datasheet_has_fields(datasheet_data, required_fields)
+            if satisfied:
+                print(f"🏁 {candidates[rank]['name']} (rank {rank + 1}) has all required fields")
+                return datasheet_data
+            extracted[rank] = datasheet_data
+    except FuturesTimeout:
+        print(f"⏱️ Deadline of {deadline}s reached with {len(extracted)} of {len(candidates)} candidates extracted")
+    finally:
+        for future in futures:
+            future.cancel()
+    
+    if extracted:
+        best_rank = min(extracted)
+        print(f"⚠️ No candidate has all required fields, using {candidates[best_rank]['name']}")
+        return extracted[best_rank]
+    return None
+
+def get_latest_production_datasheet(wire_name: str, creds, candidates: int = 1,
+                                    deadline: Optional[float] = None,
+                                    required_fields: Optional[List[str]] = None) -> Optional[Dict]:
     """
     Get the latest production datasheet for a specific wire
     
     Args:
         wire_name: Name of the wire
         creds: Google credentials
+        candidates: Number of top-ranked datasheets to extract concurrently
+        deadline: Seconds to wait for the extractions (no limit when None)
+        required_fields: Report fields a candidate must provide to be accepted
+            (defaults to REQUIRED_REPORT_FIELDS)
     
     Returns:
         Latest datasheet data or None if not found
     """
+    required_fields = required_fields or REQUIRED_REPORT_FIELDS
+    # Requests for the same wire spelled differently ("12AWG XLPE", "12 awg xlpe") share a lookup
+    key = (normalize_name(wire_name), candidates, deadline, tuple(required_fields))
+    return _lookup_flights.do(key, _find_latest_production_datasheet,
+                              wire_name, creds, candidates, deadline, required_fields)
+
+def _find_latest_production_datasheet(wire_name: str, creds, candidates: int, deadline: Optional[float],
+                                      required_fields: List[str]) -> Optional[Dict]:
     print(f"\n🚀 Searching for latest production datasheet for wire: '{wire_name}'")
     
     # Search for matching datasheets
-    matching_files = search_production_datasheets_by_wire_name(wire_name, creds)
+    matching_files = search_production_datasheets_by_wire_name(wire_name, creds, limit=max(candidates, 1))
     
     if not matching_files:
         print(f"❌ No datasheets found for wire: '{wire_name}'")
         return None
     
+    if candidates > 1 and len(matching_files) > 1:
+        print(f"🧵 Extracting top {len(matching_files)} candidates concurrently")
+        return _extract_first_satisfying(matching_files, creds, deadline, required_fields)
+    if deadline is not None:
+        # A single candidate is still only waited for until the deadline
+        return _extract_first_satisfying(matching_files[:1], creds, deadline, required_fields)
+    
     # Get the most relevant (highest score) datasheet
     best_match = matching_files[0]
     print(f"🏆 Best match: {best_match['name']} (Score: {best_match['relevance_score']})")
@@ -332,7 +510,171 @@ def get_latest_production_datasheet(wire_name: str, creds) -> Optional[Dict]:
         print(f"❌ Failed to extract data from {best_match['name']}")
         return None
 
-def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds) -> Dict:
+def get_datasheet_file(file_id: str, creds) -> Optional[Dict]:
+    """
+    Get the metadata of a specific datasheet file with a minimal fields mask
+    
+    Only files in the output folder are returned, as search would: the
+    credentials can read the whole Drive, not just that folder.
+    
+    Args:
+        file_id: Google Drive file ID (e.g. from a search result)
+        creds: Google credentials
+    
+    Returns:
+        File information in the search result shape, or None if the file is
+        missing, unsupported or outside the output folder
+    """
+    drive_service = get_service('drive', 'v3', creds)
+    
+    try:
+        file = drive_service.files().get(
+            fileId=file_id,
+            fields='id,name,mimeType,modifiedTime,parents,trashed'
+        ).execute()
+    except Exception as e:
+        print(f"❌ Failed to fetch metadata for file {file_id}: {e}")
+        return None
+    
+    if OUTPUT_FOLDER_ID not in file.pop('parents', []) or file.pop('trashed', False):
+        print(f"❌ File {file_id} is not in the output folder")
+        return None
+    if file['mimeType'] not in SUPPORTED_MIME_TYPES:
+        print(f"❌ Unsupported file type for {file['name']}: {file['mimeType']}")
+        return None
+    
+    file['url'] = file_url(file['id'], file['mimeType'])
+    return file
+
+class AliasMatcher:
+    """
+    Aho–Corasick automaton over the datasheet field aliases
+    
+    Finds every alias contained in a label (case-insensitively) in a single
+    pass over its characters, including overlapping aliases such as
+    'Insulation Type' and 'Insulation'.
+    """
+    
+    def __init__(self, aliases: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        
+        for alias_index, alias in enumerate(aliases):
+            node = 0
+            for char in alias.lower():
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            self._output[node].append(alias_index)
+        
+        # Breadth-first pass to link each node to its longest proper suffix in the trie,
+        # folding the failure links into a full transition table as we go
+        self._transitions: List[Dict[str, int]] = [dict(self._goto[0])] + [{} for _ in self._goto[1:]]
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            fail = self._fail[node]
+            self._transitions[node] = {**self._transitions[fail], **self._goto[node]}
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                self._fail[child] = self._transitions[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+    
+    def find(self, text: str) -> List[int]:
+        """Return the indices of every alias contained in ``text``"""
+        found = []
+        node = 0
+        transitions = self._transitions
+        output = self._output
+        for char in text.lower():
+            node = transitions[node].get(char, 0)
+            if output[node]:
+                found.extend(output[node])
+        return found
+
+_FIELD_ALIASES = [(field, alias) for field, aliases in FIELD_MAPPINGS.items() for alias in aliases]
+_ALIAS_MATCHER = AliasMatcher([alias for _, alias in _FIELD_ALIASES])
+
+def match_report_fields(df: pd.DataFrame, report_fields: List[str]) -> Dict[str, str]:
+    """
+    Find report field values in a datasheet laid out as label / value rows
+    
+    The label column is scanned once with the compiled alias matcher, and the
+    scan stops as soon as every requested field is decided. For each field
+    the aliases are tried in priority order; an alias resolves to the value
+    column of the first row whose label contains it, and the first non-empty
+    value wins.
+    
+    Args:
+        df: Sheet data with labels in the first column and values in the second
+        report_fields: Fields of FIELD_MAPPINGS to look for
+    
+    Returns:
+        Mapping of report field to the value found
+    """
+    if df.shape[0] == 0 or df.shape[1] == 0:
+        return {}
+    first_col = df.iloc[:, 0]
+    if first_col.dtype != 'object' and not pd.api.types.is_string_dtype(first_col.dtype):
+        return {}
+    
+    def value_at(row_position: int) -> str:
+        value = df.iat[row_position, 1] if df.shape[1] > 1 else ''
+        return str(value).strip() if pd.notna(value) else ''
+    
+    field_aliases = {field: [] for field in report_fields}
+    for alias_index, (field, _) in enumerate(_FIELD_ALIASES):
+        if field in field_aliases:
+            field_aliases[field].append(alias_index)
+    
+    first_rows: Dict[int, int] = {}
+    # Position in each undecided field's alias list that we are waiting on
+    waiting = {field: 0 for field in report_fields}
+    found = {}
+    
+    def settle(field: str) -> bool:
+        aliases = field_aliases[field]
+        position = waiting[field]
+        while position < len(aliases) and aliases[position] in first_rows:
+            value = value_at(first_rows[aliases[position]])
+            if value:
+                print(f"   ✅ Found {_FIELD_ALIASES[aliases[position]][1]}: {value}")
+                found[field] = value
+                return True
+            position += 1
+        waiting[field] = position
+        return position == len(aliases)
+    
+    for row_position, label in enumerate(first_col.tolist()):
+        if not isinstance(label, str):
+            continue
+        new_aliases = [index for index in _ALIAS_MATCHER.find(label) if index not in first_rows]
+        if not new_aliases:
+            continue
+        for alias_index in new_aliases:
+            first_rows[alias_index] = row_position
+        for field in {_FIELD_ALIASES[index][0] for index in new_aliases}:
+            if field in waiting and settle(field):
+                del waiting[field]
+        if not waiting:
+            break
+    
+    # Fields still waiting on an alias that never appeared fall through to their later aliases
+    for field in list(waiting):
+        field_aliases[field] = [index for index in field_aliases[field] if index in first_rows]
+        waiting[field] = 0
+        settle(field)
+    
+    return found
+
+def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds, candidates: int = 1,
+                                    deadline: Optional[float] = None) -> Dict:
     """
     Integrate production datasheet data into the report
     
@@ -340,6 +682,8 @@ def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds) ->
         wire_name: Name of the wire
         report_data: Existing report data
         creds: Google credentials
+        candidates: Number of top-ranked datasheets to extract concurrently
+        deadline: Seconds to wait for the extractions (no limit when None)
     
     Returns:
         Enhanced report with datasheet data
@@ -347,8 +691,22 @@ def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds) ->
     print(f"\n🔗 Integrating production datasheet data for wire: '{wire_name}'")
     
     # Get the latest production datasheet
-    datasheet_data = get_latest_production_datasheet(wire_name, creds)
+    with time_stage('integrate_lookup'):
+        datasheet_data = get_latest_production_datasheet(wire_name, creds, candidates=candidates, deadline=deadline)
     
+    return apply_datasheet_to_report(report_data, datasheet_data)
+
+def apply_datasheet_to_report(report_data: Dict, datasheet_data: Optional[Dict]) -> Dict:
+    """
+    Enhance a report with an already extracted datasheet
+    
+    Args:
+        report_data: Existing report data
+        datasheet_data: Extracted datasheet (the report is returned unchanged when None)
+    
+    Returns:
+        Enhanced report with datasheet data
+    """
     if not datasheet_data:
         print("⚠️ No datasheet data found, returning original report")
         return report_data
@@ -368,6 +726,9 @@ def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds) ->
     if 'sheets' in datasheet_data:
         enhanced_report['datasheet_sheets'] = {}
         
+        # Values already present in the report are never overwritten
+        pending_fields = [field for field, key in REPORT_FIELD_KEYS.items() if not enhanced_report.get(key)]
+        
         # Process each sheet to extract key information
         for sheet_name, sheet_data in datasheet_data['sheets'].items():
             print(f"📊 Processing sheet: {sheet_name}")
@@ -382,58 +743,12 @@ def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds) ->
                 }
                 
                 # Extract key values for report fields
-                if 'data' in sheet_data and sheet_data['data'] is not None:
-                    df = sheet_data['data']
-                    
-                    # Map common datasheet fields to report fields
-                    field_mappings = {
-                        'itemDescription': ['Product Name', 'Wire Name', 'Cable Type', 'Description', 'Item Description'],
-                        'conductor': ['Conductor Type', 'Conductor Material', 'Material'],
-                        'insulation': ['Insulation Type', 'Insulation Material', 'Insulation'],
-                        'voltage': ['Voltage Rating', 'Rated Voltage', 'Voltage'],
-                        'temperature': ['Temperature Rating', 'Operating Temperature', 'Temp Rating'],
-                        'standards': ['Standards', 'Reference Standard', 'Standard'],
-                        'awg_size': ['AWG Size', 'Conductor Size', 'Size', 'Gauge']
-                    }
-                    
-                    # Extract values for each field
-                    for report_field, datasheet_fields in field_mappings.items():
-                        for datasheet_field in datasheet_fields:
-                            try:
-                                # Search for the field in the datasheet
-                                if df.shape[0] > 0 and df.shape[1] > 0:
-                                    # Check if first column contains string data
-                                    first_col = df.iloc[:, 0]
-                                    if first_col.dtype == 'object':  # String column
-                                        matching_rows = df[first_col.str.contains(datasheet_field, case=False, na=False)]
-                                        
-                                        if not matching_rows.empty:
-                                            # Get the value from the second column
-                                            value = matching_rows.iloc[0, 1] if matching_rows.iloc[0].shape[0] > 1 else ''
-                                            
-                                            if pd.notna(value) and str(value).strip():
-                                                print(f"   ✅ Found {datasheet_field}: {value}")
-                                                
-                                                # Update the report with extracted values
-                                                if report_field == 'itemDescription' and not enhanced_report.get('itemDescription'):
-                                                    enhanced_report['itemDescription'] = str(value).strip()
-                                                elif report_field == 'conductor' and not enhanced_report.get('conductor_type'):
-                                                    enhanced_report['conductor_type'] = str(value).strip()
-                                                elif report_field == 'insulation' and not enhanced_report.get('insulation_type'):
-                                                    enhanced_report['insulation_type'] = str(value).strip()
-                                                elif report_field == 'voltage' and not enhanced_report.get('voltage_rating'):
-                                                    enhanced_report['voltage_rating'] = str(value).strip()
-                                                elif report_field == 'temperature' and not enhanced_report.get('temperature_rating'):
-                                                    enhanced_report['temperature_rating'] = str(value).strip()
-                                                elif report_field == 'standards' and not enhanced_report.get('referenceStandard'):
-                                                    enhanced_report['referenceStandard'] = str(value).strip()
-                                                elif report_field == 'awg_size' and not enhanced_report.get('awg_size'):
-                                                    enhanced_report['awg_size'] = str(value).strip()
-                                                
-                                                break  # Found the field, move to next report field
-                            except Exception as e:
-                                print(f"      ⚠️ Error processing field {datasheet_field}: {e}")
-                                continue
+                if pending_fields and sheet_data.get('data') is not None:
+                    with time_stage('integrate_match_fields'):
+                        found = match_report_fields(sheet_data['data'], pending_fields)
+                    for report_field, value in found.items():
+                        enhanced_report[REPORT_FIELD_KEYS[report_field]] = value
+                        pending_fields.remove(report_field)
             except Exception as e:
                 print(f"      ❌ Error processing sheet {sheet_name}: {e}")
                 # Store minimal sheet info if processing fails
@@ -456,6 +771,104 @@ def integrate_datasheet_into_report(wire_name: str, report_data: Dict, creds) ->
     print(f"📋 Extracted fields: {list(enhanced_report.keys())}")
     return enhanced_report
 
+def generate_batch_reports(reports: List[Dict], creds, candidates: int = 1,
+                           required_fields: Optional[List[str]] = None) -> Iterator[Tuple[int, Dict, bool]]:
+    """
+    Integrate production datasheets into many reports, extracting each distinct datasheet once
+    
+    The output folder is listed once for the whole batch and every wire is
+    ranked against the local search index. Wires whose best matches are the
+    same files share their extractions. At most BATCH_EXTRACTION_WINDOW of
+    the batch's extractions are queued on the shared pool at a time, so
+    single requests arriving meanwhile are not stuck behind the batch.
+    
+    Args:
+        reports: Base reports, each with a 'wire_name'
+        creds: Google credentials
+        candidates: Number of top-ranked datasheets to consider per wire; the
+            best ranked one with the required fields is used
+        required_fields: Report fields a candidate must provide to be preferred
+            (defaults to REQUIRED_REPORT_FIELDS)
+    
+    Yields:
+        (position in ``reports``, enhanced report, whether a datasheet was found)
+        as soon as the report's candidates are extracted; reports without any
+        matching datasheet come first
+    """
+    required_fields = required_fields or REQUIRED_REPORT_FIELDS
+    drive_service = get_service('drive', 'v3', creds)
+    
+    with time_stage('folder_index'):
+        files = get_folder_index(OUTPUT_FOLDER_ID).get_files(drive_service)
+    index = _get_search_index(files)
+    print(f"📦 Batch of {len(reports)} reports against {len(files)} files in output folder")
+    
+    # Spellings of the same wire share one search
+    searches: Dict[str, List[Dict]] = {}
+    report_candidates: Dict[int, List[Dict]] = {}
+    files_by_id: Dict[str, Dict] = {}
+    waiting_reports: Dict[str, List[int]] = {}
+    for position, report in enumerate(reports):
+        key = normalize_name(report['wire_name'])
+        if key not in searches:
+            with time_stage('search'):
+                searches[key] = index.search(report['wire_name'], max(candidates, 1))
+        matches = searches[key]
+        if not matches:
+            print(f"❌ No datasheets found for wire: '{report['wire_name']}'")
+            yield position, report, False
+            continue
+        report_candidates[position] = matches
+        for file_info in matches:
+            files_by_id.setdefault(file_info['id'], file_info)
+            if position not in waiting_reports.setdefault(file_info['id'], []):
+                waiting_reports[file_info['id']].append(position)
+    
+    print(f"🧮 {len(report_candidates)} reports resolve to {len(files_by_id)} distinct datasheets")
+    remaining = {position: {file_info['id'] for file_info in matches}
+                 for position, matches in report_candidates.items()}
+    extracted: Dict[str, Optional[Dict]] = {}
+    # Reports still waiting on each datasheet; its extraction is dropped when none are
+    unfinished = {file_id: len(positions) for file_id, positions in waiting_reports.items()}
+    
+    def choose(position: int) -> Optional[Dict]:
+        ranked = [extracted[file_info['id']] for file_info in report_candidates[position]
+                  if extracted.get(file_info['id'])]
+        if len(ranked) > 1:
+            with time_stage('check_required_fields'):
+                for datasheet_data in ranked:
+                    if datasheet_has_fields(datasheet_data, required_fields):
+                        return datasheet_data
+        return ranked[0] if ranked else None
+    
+    # Extractions start in the order the batch first needs them
+    queue = deque(files_by_id)
+    in_flight = {}
+    while queue or in_flight:
+        while queue and len(in_flight) < max(BATCH_EXTRACTION_WINDOW, 1):
+            file_id = queue.popleft()
+            in_flight[_submit_extraction(files_by_id[file_id], creds)] = file_id
+        
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            file_id = in_flight.pop(future)
+            try:
+                extracted[file_id] = future.result()
+            except Exception as e:
+                print(f"❌ Failed to extract {files_by_id[file_id]['name']}: {e}")
+                extracted[file_id] = None
+            
+            for position in waiting_reports[file_id]:
+                remaining[position].discard(file_id)
+                if remaining[position]:
+                    continue
+                datasheet_data = choose(position)
+                for done_id in {file_info['id'] for file_info in report_candidates[position]}:
+                    unfinished[done_id] -= 1
+                    if not unfinished[done_id]:
+                        extracted.pop(done_id, None)
+                yield position, apply_datasheet_to_report(reports[position], datasheet_data), datasheet_data is not None
+
 # Example usage functions
 def search_and_extract_example():
     """Example of how to use the enhanced functionality"""
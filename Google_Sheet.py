@@ -1,156 +1,203 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import pandas as pd
+import contextvars
+import json
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from Google_Client import SPREADSHEET_GRID_FIELDS, get_credentials, get_service, read_sheet_values
+from Http_Cache import files_etag, not_modified, with_etag
+from Profiler import install_profiler
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+# Opt-in sampling profiles of single requests (see Profiler.py)
+install_profiler(app)
 
-# Scopes for Drive and Sheets
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly',
-          'https://www.googleapis.com/auth/spreadsheets.readonly']
+# Maximum number of spreadsheets read at the same time by /sheet-data, across all requests
+SHEET_FETCH_CONCURRENCY = int(os.environ.get('SHEET_FETCH_CONCURRENCY', '4'))
+# Rows per record when /sheet-data streams NDJSON
+SHEET_STREAM_CHUNK_ROWS = int(os.environ.get('SHEET_STREAM_CHUNK_ROWS', '500'))
+# Sheets whose title contains one of these are returned first
+TECHNICAL_KEYWORDS = ['technical', 'specification', 'standard', 'conductor', 'insulation', 'jacket']
 
-def authenticate():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+# Long-lived so each thread keeps its keep-alive connection (see Google_Client) between requests
+_sheet_pool = ThreadPoolExecutor(max_workers=max(1, SHEET_FETCH_CONCURRENCY), thread_name_prefix='sheet-data')
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('Paras_credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
+def authenticate():
+    # Credentials are kept in memory and refreshed in the background by Google_Client
+    return get_credentials()
 
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
+def list_spreadsheet_files(drive_service) -> List[Dict]:
+    """List the spreadsheets /sheet-data reads, in reading order"""
+    # Try multiple folder IDs to find the Standard Technical Datasheet
+    FOLDER_IDS = [
+        '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN',  # Current folder
+        '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN',  # Try same folder with different search
+    ]
     
-    return creds
-
-def get_sheet_data():
+    all_files = []
+    for FOLDER_ID in FOLDER_IDS:
+        try:
+            query = f"'{FOLDER_ID}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed = false"
+            results = drive_service.files().list(q=query, fields="files(id, name, modifiedTime)").execute()
+            files = results.get('files', [])
+            all_files.extend(files)
+            print(f"Found {len(files)} files in folder {FOLDER_ID}")
+        except Exception as e:
+            print(f"Error accessing folder {FOLDER_ID}: {e}")
+    
+    # Remove duplicates
+    unique_files = []
+    seen_ids = set()
+    for file in all_files:
+        if file['id'] not in seen_ids:
+            unique_files.append(file)
+            seen_ids.add(file['id'])
+    
+    files = unique_files
+    
+    print(f"Fetching sheets from folder: {FOLDER_ID}")
+    
+    # List all spreadsheets in the folder
+    query = f"'{FOLDER_ID}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed = false"
+    results = drive_service.files().list(q=query, fields="files(id, name, modifiedTime)").execute()
+    files = results.get('files', [])
+    
+    print(f"Found {len(files)} spreadsheets in folder")
+    
+    # Also search for files by name to find Standard Technical Datasheet
     try:
-        creds = authenticate()
-        drive_service = build('drive', 'v3', credentials=creds)
-        sheets_service = build('sheets', 'v4', credentials=creds)
+        search_query = "name contains 'Standard Technical' or name contains 'Technical Datasheet' or name contains 'Standard Datasheet'"
+        search_results = drive_service.files().list(q=search_query, fields="files(id, name, modifiedTime)").execute()
+        search_files = search_results.get('files', [])
+        print(f"Found {len(search_files)} files matching technical datasheet search")
         
-        # Try multiple folder IDs to find the Standard Technical Datasheet
-        FOLDER_IDS = [
-            '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN',  # Current folder
-            '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN',  # Try same folder with different search
-        ]
+        # Add search results to files list
+        for search_file in search_files:
+            if not any(file['id'] == search_file['id'] for file in files):
+                files.append(search_file)
+                print(f"Added search result: {search_file['name']}")
+    except Exception as e:
+        print(f"Error in file search: {e}")
+    
+    return files
+
+def read_spreadsheet(sheets_service, file: Dict) -> List[Tuple[str, List[List[str]], bool]]:
+    """
+    Read every tab of one spreadsheet
+    
+    Returns:
+        (key, normalized rows, is technical sheet) for each tab with data
+    """
+    spreadsheet_id = file['id']
+    spreadsheet_name = file['name']
+    
+    print(f"Reading spreadsheet: {spreadsheet_name} (ID: {spreadsheet_id})")
+    
+    # Get the tab titles and grid sizes only
+    spreadsheet = sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields=SPREADSHEET_GRID_FIELDS
+    ).execute()
+    
+    # Read every sheet's grid, batched within the per-call cell budget
+    sheet_titles = [sheet['properties']['title'] for sheet in spreadsheet['sheets']]
+    sheet_values = read_sheet_values(sheets_service, spreadsheet_id, spreadsheet['sheets'])
+    
+    sheets = []
+    for sheet_title, values in zip(sheet_titles, sheet_values):
+        print(f"  Reading sheet: {sheet_title}")
         
-        all_files = []
-        for FOLDER_ID in FOLDER_IDS:
-            try:
-                query = f"'{FOLDER_ID}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed = false"
-                results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-                files = results.get('files', [])
-                all_files.extend(files)
-                print(f"Found {len(files)} files in folder {FOLDER_ID}")
-            except Exception as e:
-                print(f"Error accessing folder {FOLDER_ID}: {e}")
+        # Read all sheets, but prioritize non-production sheets
+        is_technical_sheet = any(keyword in sheet_title.lower() for keyword in TECHNICAL_KEYWORDS)
+        is_production_sheet = 'production data sheet' in sheet_title.lower()
         
-        # Remove duplicates
-        unique_files = []
-        seen_ids = set()
-        for file in all_files:
-            if file['id'] not in seen_ids:
-                unique_files.append(file)
-                seen_ids.add(file['id'])
+        if not values:
+            print(f"    No data found in sheet: {sheet_title}")
+            continue
         
-        files = unique_files
+        header = values[0]
+        data_rows = values[1:]
         
-        print(f"Fetching sheets from folder: {FOLDER_ID}")
+        # Normalize rows
+        normalized_data = []
+        for row in data_rows:
+            normalized_row = row + [''] * (len(header) - len(row))
+            normalized_row = normalized_row[:len(header)]
+            normalized_data.append(normalized_row)
         
-        # List all spreadsheets in the folder
-        query = f"'{FOLDER_ID}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
+        # Use spreadsheet name and sheet title as key
+        key = f"{spreadsheet_name} - {sheet_title}"
+        sheets.append((key, normalized_data, is_technical_sheet))
+        print(f"    Successfully read {len(normalized_data)} rows from {key}")
         
-        print(f"Found {len(files)} spreadsheets in folder")
+        if is_technical_sheet:
+            print(f"    Prioritized technical sheet: {key}")
+        elif is_production_sheet:
+            # Mark production sheets as lower priority but still include them
+            print(f"    Included production sheet: {key}")
+    
+    return sheets
+
+def _timed_read(sheets_service, file: Dict) -> Tuple[Optional[List], float]:
+    start = time.perf_counter()
+    try:
+        sheets = read_spreadsheet(sheets_service, file)
+    except Exception as e:
+        print(f"Error reading spreadsheet {file['name']} (ID: {file['id']}): {e}")
+        sheets = None
+    elapsed = time.perf_counter() - start
+    print(f"  Read {file['name']} in {elapsed * 1000:.0f} ms")
+    return sheets, elapsed
+
+def _submit_read(sheets_service, file: Dict):
+    # Each read runs in a copy of this context so its metrics keep the request's endpoint label
+    return _sheet_pool.submit(contextvars.copy_context().run, _timed_read, sheets_service, file)
+
+def get_sheet_data(timings: Optional[List[Tuple[str, float]]] = None, files: Optional[List[Dict]] = None,
+                   failed: Optional[List[str]] = None):
+    """
+    Read every tab of every spreadsheet on the shared pool (SHEET_FETCH_CONCURRENCY workbooks at once per process)
+    
+    Args:
+        timings: Optional list that receives (spreadsheet name, seconds) per workbook
+        files: Spreadsheets to read (listed with list_spreadsheet_files when None)
+        failed: Optional list that receives the names of spreadsheets that could not be read
+    
+    Returns:
+        Mapping of "<spreadsheet> - <sheet>" to rows, technical sheets first, or None on failure
+    """
+    try:
+        creds = authenticate()
+        drive_service = get_service('drive', 'v3', creds)
+        sheets_service = get_service('sheets', 'v4', creds)
         
-        # Also search for files by name to find Standard Technical Datasheet
-        try:
-            search_query = "name contains 'Standard Technical' or name contains 'Technical Datasheet' or name contains 'Standard Datasheet'"
-            search_results = drive_service.files().list(q=search_query, fields="files(id, name)").execute()
-            search_files = search_results.get('files', [])
-            print(f"Found {len(search_files)} files matching technical datasheet search")
-            
-            # Add search results to files list
-            for search_file in search_files:
-                if not any(file['id'] == search_file['id'] for file in files):
-                    files.append(search_file)
-                    print(f"Added search result: {search_file['name']}")
-        except Exception as e:
-            print(f"Error in file search: {e}")
+        if files is None:
+            files = list_spreadsheet_files(drive_service)
+        
+        futures = [_submit_read(sheets_service, file) for file in files]
+        results = [future.result() for future in futures]
+        
+        # Assemble in listing order regardless of completion order. Technical sheets go
+        # first, each one ahead of those read before it, as the sequential reader did.
+        technical_sheets = []
+        other_sheets = []
+        for file, (sheets, elapsed) in zip(files, results):
+            if timings is not None:
+                timings.append((file['name'], elapsed))
+            if sheets is None and failed is not None:
+                failed.append(file['name'])
+            for key, rows, is_technical_sheet in sheets or []:
+                (technical_sheets if is_technical_sheet else other_sheets).append((key, rows))
         
         all_data = {}
-        for file in files:
-            spreadsheet_id = file['id']
-            spreadsheet_name = file['name']
-            
-            print(f"Reading spreadsheet: {spreadsheet_name} (ID: {spreadsheet_id})")
-            
-            try:
-                # Get full spreadsheet info
-                spreadsheet = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-                
-                for sheet in spreadsheet['sheets']:
-                    sheet_title = sheet['properties']['title']
-                    print(f"  Reading sheet: {sheet_title}")
-                    
-                    # Read all sheets, but prioritize non-production sheets
-                    technical_keywords = ['technical', 'specification', 'standard', 'conductor', 'insulation', 'jacket']
-                    is_technical_sheet = any(keyword in sheet_title.lower() for keyword in technical_keywords)
-                    is_production_sheet = 'production data sheet' in sheet_title.lower()
-                    
-                    # Read data from each sheet
-                    range_name = f"{sheet_title}!A:Z"
-                    result = sheets_service.spreadsheets().values().get(
-                        spreadsheetId=spreadsheet_id,
-                        range=range_name
-                    ).execute()
-                    
-                    values = result.get('values', [])
-                    if not values:
-                        print(f"    No data found in sheet: {sheet_title}")
-                        continue
-                    
-                    header = values[0]
-                    data_rows = values[1:]
-                    
-                    # Normalize rows
-                    normalized_data = []
-                    for row in data_rows:
-                        normalized_row = row + [''] * (len(header) - len(row))
-                        normalized_row = normalized_row[:len(header)]
-                        normalized_data.append(normalized_row)
-                    
-                    # Use spreadsheet name and sheet title as key
-                    key = f"{spreadsheet_name} - {sheet_title}"
-                    all_data[key] = normalized_data
-                    print(f"    Successfully read {len(normalized_data)} rows from {key}")
-                    
-                    # If this is a technical sheet, prioritize it by placing it first in the data
-                    if is_technical_sheet:
-                        # Move this sheet to the beginning of all_data
-                        temp_data = {key: all_data[key]}
-                        for k, v in list(all_data.items()):
-                            if k != key:
-                                temp_data[k] = v
-                        all_data = temp_data
-                        print(f"    Prioritized technical sheet: {key}")
-                    elif is_production_sheet:
-                        # Mark production sheets as lower priority but still include them
-                        print(f"    Included production sheet: {key}")
-                    
-            except Exception as e:
-                print(f"Error reading spreadsheet {spreadsheet_name} (ID: {spreadsheet_id}): {e}")
-                continue
+        for key, rows in reversed(technical_sheets):
+            all_data[key] = rows
+        for key, rows in other_sheets:
+            all_data[key] = rows
         
         return all_data
         
@@ -164,11 +211,103 @@ def get_sheet_data():
 def test():
     return jsonify({"status": "ok", "message": "Flask server is running"})
 
+def iter_sheet_records(files: Optional[List[Dict]] = None):
+    """
+    Yield /sheet-data as NDJSON-ready records while the spreadsheets are read
+    
+    Workbooks are read on the same shared pool as get_sheet_data, at most
+    SHEET_FETCH_CONCURRENCY of them in flight at once, and each one's tabs
+    are yielded (in row chunks of SHEET_STREAM_CHUNK_ROWS) and released as
+    soon as it completes, so memory stays bounded by the workers rather
+    than the folder. The final record lists the keys in the same priority
+    order get_sheet_data uses.
+    """
+    creds = authenticate()
+    drive_service = get_service('drive', 'v3', creds)
+    sheets_service = get_service('sheets', 'v4', creds)
+    
+    if files is None:
+        files = list_spreadsheet_files(drive_service)
+    yield {'type': 'start', 'spreadsheets': len(files)}
+    
+    # (listing position, tab position, key, is technical) for the final ordering
+    read_sheets = []
+    in_flight = {}
+    next_file = 0
+    while in_flight or next_file < len(files):
+        while next_file < len(files) and len(in_flight) < SHEET_FETCH_CONCURRENCY:
+            in_flight[_submit_read(sheets_service, files[next_file])] = next_file
+            next_file += 1
+        
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            position = in_flight.pop(future)
+            file = files[position]
+            sheets, elapsed = future.result()
+            if sheets is None:
+                yield {'type': 'error', 'spreadsheet': file['name'], 'error': 'Failed to read spreadsheet'}
+                continue
+            for tab_position, (key, rows, is_technical_sheet) in enumerate(sheets):
+                read_sheets.append((position, tab_position, key, is_technical_sheet))
+                for offset in range(0, max(len(rows), 1), SHEET_STREAM_CHUNK_ROWS):
+                    yield {
+                        'type': 'sheet',
+                        'key': key,
+                        'technical': is_technical_sheet,
+                        'offset': offset,
+                        'rows': rows[offset:offset + SHEET_STREAM_CHUNK_ROWS]
+                    }
+            yield {'type': 'timing', 'spreadsheet': file['name'], 'ms': round(elapsed * 1000, 1)}
+    
+    read_sheets.sort()
+    technical_keys = [key for _, _, key, is_technical_sheet in read_sheets if is_technical_sheet]
+    other_keys = [key for _, _, key, is_technical_sheet in read_sheets if not is_technical_sheet]
+    yield {'type': 'end', 'sheets': len(read_sheets), 'order': technical_keys[::-1] + other_keys}
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    """Format per-spreadsheet timings as a Server-Timing header value"""
+    entries = []
+    for position, (name, seconds) in enumerate(timings):
+        description = name.encode('ascii', 'replace').decode().replace('\\', '').replace('"', "'")
+        entries.append(f'sheet{position};dur={seconds * 1000:.1f};desc="{description}"')
+    return ', '.join(entries)
+
 @app.route('/sheet-data', methods=['GET'])
 def sheet_data():
-    data = get_sheet_data()
+    output_format = request.args.get('format', 'json')
+    
+    # Unchanged spreadsheets are answered from the listing alone, before any of them is read
+    try:
+        files = list_spreadsheet_files(get_service('drive', 'v3', authenticate()))
+    except Exception as e:
+        print(f"Error listing spreadsheets: {e}")
+        return jsonify({"error": f"Failed to fetch sheet data: {e}"}), 500
+    etag = files_etag(files, 'sheet-data', output_format)
+    cached_response = not_modified(etag)
+    if cached_response is not None:
+        return cached_response
+    
+    # ?format=ndjson streams one record per sheet as soon as it is read
+    if output_format == 'ndjson':
+        def generate():
+            try:
+                for record in iter_sheet_records(files):
+                    yield json.dumps(record) + '\n'
+            except Exception as e:
+                print(f"Error streaming sheet data: {e}")
+                yield json.dumps({'type': 'error', 'error': f'Failed to fetch sheet data: {e}'}) + '\n'
+        # Not tagged: whether the stream completes is only known once it has been sent
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    timings = []
+    failed = []
+    data = get_sheet_data(timings, files, failed)
     if data:
-        return jsonify(data)
+        response = jsonify(data)
+        # Lets slow workbooks be spotted in the browser's network panel
+        response.headers['Server-Timing'] = server_timing(timings)
+        # Partial data must not be revalidated as complete
+        return with_etag(response, etag) if not failed else response
     else:
         return jsonify({"error": "Failed to fetch sheet data"}), 500
 
@@ -176,15 +315,20 @@ def sheet_data():
 def list_sheets():
     try:
         creds = authenticate()
-        drive_service = build('drive', 'v3', credentials=creds)
+        drive_service = get_service('drive', 'v3', creds)
         
         # Use the same folder ID as in Google_Drive.py
         FOLDER_ID = '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN'
         
         query = f"'{FOLDER_ID}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
+        results = drive_service.files().list(q=query, fields="files(id, name, modifiedTime)").execute()
         files = results.get('files', [])
         
+        etag = files_etag(files, 'list-sheets')
+        cached_response = not_modified(etag)
+        if cached_response is not None:
+            return cached_response
+        
         sheets_info = []
         for file in files:
             sheets_info.append({
@@ -193,11 +337,11 @@ def list_sheets():
                 'url': f"https://docs.google.com/spreadsheets/d/{file['id']}"
             })
         
-        return jsonify({
+        return with_etag(jsonify({
             'folder_id': FOLDER_ID,
             'sheets': sheets_info,
             'count': len(sheets_info)
-        })
+        }), etag)
         
     except Exception as e:
         print(f"Error listing sheets: {e}")
@@ -209,10 +353,13 @@ def list_sheets():
 def list_sheets_in_spreadsheet(spreadsheet_id):
     try:
         creds = authenticate()
-        sheets_service = build('sheets', 'v4', credentials=creds)
+        sheets_service = get_service('sheets', 'v4', creds)
         
-        # Get full spreadsheet info
-        spreadsheet = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+        # Get the tab titles and ids only
+        spreadsheet = sheets_service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties(title,sheetId)'
+        ).execute()
         
         sheets_info = []
         for sheet in spreadsheet['sheets']:
@@ -234,13 +381,14 @@ def list_sheets_in_spreadsheet(spreadsheet_id):
 def test_sheet(sheet_id):
     try:
         creds = authenticate()
-        sheets_service = build('sheets', 'v4', credentials=creds)
+        sheets_service = get_service('sheets', 'v4', creds)
         
         # Get the first 10 rows of the specified sheet
         range_name = "A1:Z10"
         result = sheets_service.spreadsheets().values().get(
             spreadsheetId=sheet_id,
-            range=range_name
+            range=range_name,
+            fields='values'
         ).execute()
         
         values = result.get('values', [])
@@ -257,4 +405,6 @@ def test_sheet(sheet_id):
         return jsonify({"error": f"Failed to test sheet: {e}"}), 500
 
 if __name__ == '__main__':
+    # Load credentials and start the background token refresh before serving
+    authenticate()
     app.run(host='0.0.0.0', port=5000, debug=True)
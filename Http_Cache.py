@@ -0,0 +1,54 @@
+"""
+Conditional request helpers shared by the Flask apps.
+
+Responses built from Drive files get a strong ETag derived from the files'
+ids and modifiedTime values, so a client that re-polls with If-None-Match
+receives an empty 304 as soon as the (cheap) metadata shows nothing has
+changed, before any spreadsheet is read or any JSON is serialized. Only
+GET and HEAD are answered with 304; other methods get 412 (RFC 9110 13.1.2).
+"""
+import hashlib
+from typing import Dict, Iterable, Optional
+from flask import Response, request
+
+# Clients may keep responses but must revalidate them on every use
+CACHE_CONTROL = 'private, no-cache'
+# Part of every ETag: bump it whenever a tagged response body changes shape (e.g. new
+# summary fields), so clients holding ETags from before a deploy get the new body
+RESPONSE_FORMAT_VERSION = '2'
+
+
+def files_etag(files: Iterable[Dict], *variant: str) -> str:
+    """
+    Strong ETag for a response derived from the given Drive files
+
+    Args:
+        files: Files in response order, each with 'id' and 'modifiedTime'
+        variant: Anything else the representation depends on (route, format, options)
+
+    Returns:
+        Unquoted ETag value
+    """
+    digest = hashlib.sha256()
+    for part in (RESPONSE_FORMAT_VERSION, *variant):
+        digest.update(f"{part}\n".encode('utf-8'))
+    for file in files:
+        digest.update(f"{file['id']}:{file.get('modifiedTime', '')}\n".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """Return an empty 304 (412 for methods other than GET / HEAD) when If-None-Match matches the ETag"""
+    # If-None-Match uses the weak comparison function (RFC 9110 13.1.2)
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    if request.method not in ('GET', 'HEAD'):
+        return Response(status=412)
+    return with_etag(Response(status=304), etag)
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Attach the ETag and revalidation headers to a response"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -0,0 +1,352 @@
+"""
+Prometheus-format latency and cache metrics.
+
+Counters and histograms are kept in memory and rendered in the Prometheus
+text exposition format by ``render_metrics`` (served on /metrics). Every
+sample carries an ``endpoint`` label naming the Flask route that caused it
+(``warmup`` or ``background`` outside a request), so Google API calls and
+extraction stages can be attributed to the request that triggered them.
+
+With several worker processes (WEB_CONCURRENCY > 1) each worker publishes
+its samples to METRICS_DIR every few seconds, and /metrics returns the
+totals of all workers, whichever one serves the scrape.
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Worker processes sharing one /metrics view (set by serve.py)
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+# Where worker processes publish their samples to each other
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'paras_wires_metrics'))
+# Seconds between a worker's snapshots, i.e. how stale other workers' samples can be
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_endpoint = contextvars.ContextVar('metrics_endpoint', default='background')
+
+
+def set_endpoint(endpoint: str) -> contextvars.Token:
+    """Label the metrics recorded in the current context with ``endpoint``"""
+    return _endpoint.set(endpoint)
+
+
+def reset_endpoint(token: contextvars.Token):
+    _endpoint.reset(token)
+
+
+def current_endpoint() -> str:
+    return _endpoint.get()
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if 'endpoint' in self.labelnames and 'endpoint' not in labels:
+            labels['endpoint'] = _endpoint.get()
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values per label set, in fixed buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the ``with`` block, also when it raises"""
+        # Resolve the endpoint now: the block may run code that changes it
+        labels.setdefault('endpoint', _endpoint.get())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric_class, name: str, documentation: str, labelnames: Sequence[str], **options) -> _Metric:
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = metric_class(name, documentation, labelnames, **options)
+        elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Return the process-wide counter ``name``, creating it on first use"""
+    return _register(Counter, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    """Return the process-wide histogram ``name``, creating it on first use"""
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def _snapshot() -> Dict:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: {
+        'kind': metric.kind,
+        'documentation': metric.documentation,
+        'labelnames': list(metric.labelnames),
+        'buckets': list(getattr(metric, 'buckets', [])),
+        'values': metric.snapshot(),
+    } for metric in metrics}
+
+
+def _merge(snapshots: List[Dict]) -> Dict:
+    """Add up the samples of several processes' snapshots"""
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, values={}))
+            if target['labelnames'] != metric['labelnames'] or target['buckets'] != metric['buckets']:
+                continue
+            for labels, value in metric['values']:
+                key = tuple(labels)
+                if metric['kind'] == 'counter':
+                    target['values'][key] = target['values'].get(key, 0.0) + value
+                else:
+                    counts, total = target['values'].get(key, ([0] * len(value[0]), 0.0))
+                    target['values'][key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+    return merged
+
+
+# --- Sharing between worker processes ---
+
+_process_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_flusher: Optional[threading.Thread] = None
+
+
+def _snapshot_path() -> str:
+    return os.path.join(METRICS_DIR, f"{_process_id}.json")
+
+
+def _publish():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    temp_path = f"{_snapshot_path()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(temp_path, _snapshot_path())
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            _publish()
+        except OSError as e:
+            print(f"⚠️ Failed to publish metrics: {e}")
+
+
+def _start_flusher():
+    global _flusher
+    if WEB_CONCURRENCY > 1:
+        _flusher = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+        _flusher.start()
+
+
+def _after_fork():
+    """A forked worker starts with empty metrics of its own and its own flush thread"""
+    global _process_id, _registry_lock
+    _process_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    _registry_lock = threading.Lock()
+    for metric in _registry.values():
+        metric._reset()
+    _start_flusher()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+_start_flusher()
+
+
+def clear_published_metrics():
+    """Remove snapshots left by earlier server runs (call before starting the workers)"""
+    if os.path.isdir(METRICS_DIR):
+        for file_name in os.listdir(METRICS_DIR):
+            if file_name.endswith('.json'):
+                os.remove(os.path.join(METRICS_DIR, file_name))
+
+
+def _published_snapshots() -> List[Dict]:
+    """Latest snapshots of the other workers, including ones that have exited (counters never go back)"""
+    snapshots = []
+    if not os.path.isdir(METRICS_DIR):
+        return snapshots
+    for file_name in os.listdir(METRICS_DIR):
+        if not file_name.endswith('.json') or file_name == f"{_process_id}.json":
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, file_name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+# --- Text exposition format ---
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_metrics() -> str:
+    """All metrics of all workers in the Prometheus text exposition format"""
+    snapshots = [_snapshot()]
+    if WEB_CONCURRENCY > 1:
+        snapshots.extend(_published_snapshots())
+
+    lines = []
+    for name, metric in sorted(_merge(snapshots).items()):
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric['labelnames']
+        for key, value in sorted(metric['values'].items()):
+            if metric['kind'] == 'counter':
+                lines.append(f"{name}{_labels(labelnames, key)} {_format_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_number(bound)
+                lines.append(f"{name}_bucket{_labels(labelnames, key, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, key)} {_format_number(total)}")
+            lines.append(f"{name}_count{_labels(labelnames, key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+# --- Metrics shared by the modules ---
+
+HTTP_REQUEST_SECONDS = histogram(
+    'http_request_duration_seconds', 'Time to handle an API request',
+    ['endpoint', 'method', 'status'])
+GOOGLE_API_SECONDS = histogram(
+    'google_api_request_duration_seconds', 'Time of each Google API call attempt',
+    ['endpoint', 'method', 'status'])
+GOOGLE_API_THROTTLE_SECONDS = histogram(
+    'google_api_throttle_wait_seconds', 'Time spent waiting for the local Google API rate limit',
+    ['endpoint', 'method'])
+CACHE_LOOKUPS = counter(
+    'datasheet_cache_lookups_total', 'Extracted-datasheet cache lookups by tier and result',
+    ['endpoint', 'tier', 'result'])
+COALESCED_CALLS = counter(
+    'single_flight_coalesced_total', 'Calls that joined an identical in-flight lookup or extraction',
+    ['endpoint', 'flight'])
+STAGE_SECONDS = histogram(
+    'datasheet_stage_duration_seconds', 'Time spent in each datasheet search, extraction and integration stage',
+    ['endpoint', 'stage'])
+
+
+def time_stage(stage: str):
+    """Context manager timing one stage into datasheet_stage_duration_seconds"""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def instrument_app(app):
+    """Label metrics with the Flask route, time every request and serve GET /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_token = set_endpoint(g.metrics_endpoint)
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        labels = {'endpoint': g.metrics_endpoint, 'method': request.method, 'status': response.status_code}
+        if response.is_streamed:
+            # Runs once the body has been sent, so streamed responses are timed to the end
+            response.call_on_close(lambda: HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, **labels))
+        else:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+        return response
+
+    @app.teardown_request
+    def _end_request_metrics(error=None):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            reset_endpoint(token)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,250 @@
+"""
+On-demand sampling profiler for live requests.
+
+A profiled request gets a sampler thread that records the request thread's
+call stack every PROFILE_INTERVAL seconds (via ``sys._current_frames``, so
+the request itself runs uninstrumented). When the response has been sent,
+the stacks are written as a folded-stack profile. flamegraph.pl, speedscope
+and inferno all read that format.
+
+A request is profiled when:
+- it carries an ``X-Profile: <PROFILE_TOKEN>`` header. Without PROFILE_TOKEN
+  set, clients cannot trigger profiling. The token is never read from the
+  query string, which ends up in access logs, proxy logs and browser history.
+- or PROFILE_SAMPLE_EVERY is N > 0, which profiles one request in N.
+  This is configured on the server only.
+
+Either way, at most PROFILE_MAX_ACTIVE requests per process are profiled at
+a time. The profile id is returned in the ``X-Profile-Id`` response header.
+The stored profile can be downloaded, with the token header, from
+``/debug/profiles/<id>``. Send ``X-Profile-Output: inline`` (or
+``profile_output=inline``) to get the folded stacks as the response body
+instead. Send ``X-Profile-Threads: all`` (or ``profile_threads=all``) to
+sample every thread, which includes the extraction pool.
+"""
+import hmac
+import itertools
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+# Shared secret that lets a client profile its own request (unset: disabled)
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+# Profile one request in N without any client flag (0 disables)
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', '0'))
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.005'))
+# A sampler stops by itself after this many seconds
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '120'))
+# Most requests profiled at the same time in one process
+PROFILE_MAX_ACTIVE = int(os.environ.get('PROFILE_MAX_ACTIVE', '2'))
+# Where profiles are stored, and how many of the newest are kept
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'paras_wires_profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '200'))
+
+_PROFILE_ID = re.compile(r'^[\w.-]+$')
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread (or of every thread) from a background thread
+
+    Args:
+        thread_id: ``threading.get_ident()`` of the thread to sample, or None for all threads
+        interval: Seconds between samples
+        max_seconds: Stop sampling after this long even if ``stop`` is never called
+    """
+
+    def __init__(self, thread_id: Optional[int], interval: float = PROFILE_INTERVAL,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self.duration = 0.0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._started = 0.0
+
+    def start(self) -> 'SamplingProfiler':
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> 'SamplingProfiler':
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        deadline = time.perf_counter() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self._record(frame)
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id != own_id:
+                    self._record(frame, names.get(thread_id, str(thread_id)))
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                          f"{code.co_firstlineno})")
+        return label
+
+    def _record(self, frame, root: Optional[str] = None):
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        if root is not None:
+            stack.append(root)
+        stack.reverse()
+        self.samples[';'.join(stack)] += 1
+
+    def folded(self) -> str:
+        """Profile in the folded-stack format: one ``frame;frame;frame count`` line per distinct stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+# --- Storage ---
+
+def save_profile(profile_id: str, profiler: SamplingProfiler) -> str:
+    """Write a profile to PROFILE_DIR, dropping the oldest beyond PROFILE_KEEP; returns its path"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+    with open(path, 'w') as f:
+        f.write(profiler.folded())
+
+    stored = sorted((entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.folded')),
+                    key=lambda entry: entry.stat().st_mtime)
+    for entry in stored[:max(0, len(stored) - PROFILE_KEEP)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+
+def load_profile(profile_id: str) -> Optional[str]:
+    """Return a stored profile, or None if the id is unknown or malformed"""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded")) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# --- Flask integration ---
+
+_request_counter = itertools.count(1)
+_counter_lock = threading.Lock()
+_active = threading.BoundedSemaphore(max(1, PROFILE_MAX_ACTIVE))
+
+
+def _client_option(header: str, parameter: str) -> str:
+    from flask import request
+    return request.headers.get(header) or request.args.get(parameter, '')
+
+
+def _has_token() -> bool:
+    from flask import request
+    # Header only: a secret in the URL would be written to access logs
+    supplied = request.headers.get('X-Profile', '')
+    return (bool(PROFILE_TOKEN) and bool(supplied)
+            and hmac.compare_digest(supplied.encode('utf-8'), PROFILE_TOKEN.encode('utf-8')))
+
+
+def _sampled() -> bool:
+    if PROFILE_SAMPLE_EVERY <= 0:
+        return False
+    with _counter_lock:
+        return next(_request_counter) % PROFILE_SAMPLE_EVERY == 0
+
+
+def _finish(profiler: SamplingProfiler, profile_id: str, description: str):
+    try:
+        profiler.stop()
+        path = save_profile(profile_id, profiler)
+        print(f"🔬 Profiled {description} in {profiler.duration * 1000:.0f} ms "
+              f"({sum(profiler.samples.values())} samples) -> {path}")
+    except Exception as e:
+        print(f"⚠️ Failed to store profile {profile_id}: {e}")
+    finally:
+        _active.release()
+
+
+def install_profiler(app):
+    """Profile requests of a Flask app on demand and serve stored profiles on /debug/profiles/<id>"""
+    from flask import Response, abort, g, request
+
+    @app.before_request
+    def _start_profiler():
+        if request.endpoint == 'get_profile':
+            return
+        requested = _has_token()
+        if not (requested or _sampled()):
+            return
+        if not _active.acquire(blocking=False):
+            print(f"⚠️ Not profiling {request.method} {request.path}: {PROFILE_MAX_ACTIVE} profile(s) already running")
+            return
+        all_threads = requested and _client_option('X-Profile-Threads', 'profile_threads') == 'all'
+        g.profiler = SamplingProfiler(None if all_threads else threading.get_ident()).start()
+        g.profile_inline = requested and _client_option('X-Profile-Output', 'profile_output') == 'inline'
+
+    @app.after_request
+    def _stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+
+        # Streamed bodies are produced after this hook, so they can only be stored
+        if g.pop('profile_inline', False) and not response.is_streamed:
+            profiler.stop()
+            _active.release()
+            inline = Response(profiler.folded(), mimetype='text/plain')
+            inline.headers['X-Profile-Duration-Ms'] = f"{profiler.duration * 1000:.0f}"
+            inline.headers['X-Profile-Status'] = str(response.status_code)
+            return inline
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        description = f"{request.method} {request.path}"
+        response.headers['X-Profile-Id'] = profile_id
+        # Runs once the body has been sent, so streamed responses are profiled to the end
+        response.call_on_close(lambda: _finish(profiler, profile_id, description))
+        return response
+
+    @app.teardown_request
+    def _discard_profiler(error=None):
+        # Only left here when no response was produced
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            _active.release()
+
+    @app.route('/debug/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        if not _has_token():
+            abort(404)
+        profile = load_profile(profile_id)
+        if profile is None:
+            abort(404)
+        return Response(profile, mimetype='text/plain')
+
+    return app
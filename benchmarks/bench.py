@@ -0,0 +1,193 @@
+"""
+Benchmarks of the datasheet and sheet services against the local fake API.
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --spreadsheets 100 --tabs 3 --rows 2000 --latency 0.05
+
+Every benchmark runs once to warm up and then ``--repeat`` times. The
+median, 90th percentile and minimum of each are printed and appended to
+benchmarks/results.jsonl with the current git commit. The run is compared
+with the latest earlier run of the same workload on this machine. A median
+more than ``--threshold`` slower is reported as a regression, and with
+--fail-on-regression the exit status is 1.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_google import WIRE_TYPES, FakeGoogle, configure_services  # noqa: E402
+
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+# Slowdowns smaller than this (seconds) are noise, whatever the ratio
+MIN_REGRESSION_DELTA = 0.002
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the datasheet services against a fake Google backend')
+    parser.add_argument('--spreadsheets', type=int, default=30, help='Spreadsheets in the fake folder')
+    parser.add_argument('--documents', type=int, default=5, help='Documents in the fake folder')
+    parser.add_argument('--tabs', type=int, default=1, help='Production data tabs per spreadsheet')
+    parser.add_argument('--rows', type=int, default=300, help='Rows per production data tab')
+    parser.add_argument('--columns', type=int, default=40, help='Columns per production data tab')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every fake API response')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--only', nargs='*', help='Run only these benchmarks')
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help='JSON lines file of past runs')
+    parser.add_argument('--no-save', action='store_true', help='Compare without recording this run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown of a median reported as a regression (default 0.2)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on a regression')
+    return parser.parse_args()
+
+
+def git_commit() -> Dict:
+    def git(*args) -> str:
+        return subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+def measure(function: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict:
+    """Time ``function`` after one warm-up call; ``setup`` runs untimed before every call"""
+    timings = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for run in range(repeat + 1):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            function()
+            if run:
+                timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'median': statistics.median(timings),
+        'p90': timings[min(len(timings) - 1, int(0.9 * len(timings)))],
+        'min': timings[0],
+        'runs': len(timings),
+    }
+
+
+def benchmarks(fake: FakeGoogle) -> Dict[str, tuple]:
+    """Benchmark name -> (function, setup)"""
+    from Datasheet_Search import file_url
+    from Drive_Cache import get_extracted_cache
+    import Google_Drive
+    import Google_Sheet
+
+    creds = Google_Drive.authenticate()
+    spreadsheet = next(f for f in fake.drive.files if f['mimeType'].endswith('spreadsheet'))
+    spreadsheet = dict(spreadsheet, url=file_url(spreadsheet['id'], spreadsheet['mimeType']))
+    wire_names = itertools.cycle(WIRE_TYPES)
+
+    return {
+        # Folder index already synced: ranking against the local index
+        'search': (lambda: Google_Drive.search_production_datasheets_by_wire_name(next(wire_names), creds), None),
+        # One workbook: metadata, batched value reads, parsing and summaries
+        'extract_spreadsheet': (lambda: Google_Drive.extract_spreadsheet_data(spreadsheet, creds), None),
+        # Empty extracted-datasheet cache: search, extraction of the best match, field matching.
+        # One candidate, so no extraction is left running in the background between runs.
+        'integrate_cold': (lambda: Google_Drive.integrate_datasheet_into_report('12 AWG XLPE', {}, creds),
+                           get_extracted_cache().clear),
+        # Same report again, served from the cache
+        'integrate_warm': (lambda: Google_Drive.integrate_datasheet_into_report('12 AWG XLPE', {}, creds), None),
+        # Every tab of every spreadsheet in the folder
+        'get_sheet_data': (Google_Sheet.get_sheet_data, None),
+    }
+
+
+def load_baseline(path: str, host: str, workload: Dict) -> Optional[Dict]:
+    """Latest recorded run of the same workload on this host"""
+    if not os.path.exists(path):
+        return None
+    baseline = None
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('host') == host and record.get('workload') == workload:
+                baseline = record
+    return baseline
+
+
+def report(results: Dict[str, Dict], baseline: Optional[Dict], threshold: float) -> List[str]:
+    """Print the results next to the baseline; returns the names of regressed benchmarks"""
+    previous = baseline['results'] if baseline else {}
+    if baseline:
+        print(f"Baseline: {baseline['commit']}{' (dirty)' if baseline['dirty'] else ''} "
+              f"{baseline['subject'][:60]} ({baseline['timestamp']})")
+    print(f"{'benchmark':<22} {'median ms':>10} {'p90 ms':>10} {'min ms':>10} {'baseline':>10} {'change':>8}")
+
+    regressions = []
+    for name, result in results.items():
+        line = (f"{name:<22} {result['median'] * 1000:>10.1f} {result['p90'] * 1000:>10.1f} "
+                f"{result['min'] * 1000:>10.1f}")
+        old = previous.get(name)
+        if old:
+            change = result['median'] / old['median'] - 1 if old['median'] else 0.0
+            line += f" {old['median'] * 1000:>10.1f} {change:>+7.0%}"
+            if change > threshold and result['median'] - old['median'] > MIN_REGRESSION_DELTA:
+                regressions.append(name)
+                line += '  ⚠️ regression'
+        print(line)
+    return regressions
+
+
+def main() -> int:
+    args = parse_args()
+    workload = {key: getattr(args, key) for key in ('spreadsheets', 'documents', 'tabs', 'rows', 'columns',
+                                                     'latency')}
+
+    fake = FakeGoogle(latency=args.latency, spreadsheets=args.spreadsheets, documents=args.documents,
+                      tabs=args.tabs, rows=args.rows, wide_columns=args.columns).start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_services(fake.url, workdir)
+            for name, (function, setup) in benchmarks(fake).items():
+                if args.only and name not in args.only:
+                    continue
+                print(f"⏱️ {name}...", flush=True)
+                results[name] = measure(function, args.repeat, setup)
+    finally:
+        fake.stop()
+
+    host = socket.gethostname()
+    baseline = load_baseline(args.results, host, workload)
+    regressions = report(results, baseline, args.threshold)
+
+    if not args.no_save:
+        record = dict(git_commit(), timestamp=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                      host=host, python=platform.python_version(), workload=workload, results=results)
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"\n📝 Recorded in {args.results}")
+
+    if regressions:
+        print(f"⚠️ {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
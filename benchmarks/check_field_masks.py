@@ -0,0 +1,103 @@
+"""
+Check that every Google API call requests a partial response.
+
+Runs the datasheet and sheet services against the local fake API
+(fake_google.py), fails if any request was sent without a ``fields`` mask,
+and reports how many bytes each call received compared with the full
+resource:
+
+    python benchmarks/check_field_masks.py
+"""
+import json
+import os
+import sys
+import tempfile
+from collections import defaultdict
+from urllib.parse import quote, urlencode
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_google import FakeGoogle, configure_services  # noqa: E402
+
+
+def exercise(fake: FakeGoogle):
+    """Drive every code path that calls a Google API"""
+    import Google_Drive
+    import Google_Sheet
+    import test_server
+
+    creds = Google_Drive.authenticate()
+    spreadsheet = next(f for f in fake.drive.files if f['mimeType'].endswith('spreadsheet'))
+    document = next(f for f in fake.drive.files if f['mimeType'].endswith('document'))
+
+    results = Google_Drive.search_production_datasheets_by_wire_name('12 AWG XLPE', creds)
+    assert results, "search returned no datasheets"
+    assert Google_Sheet.get_sheet_data(), "/sheet-data returned nothing"
+
+    sheet_client = Google_Sheet.app.test_client()
+    for path in ('/list-sheets', f"/list-sheets/{spreadsheet['id']}", f"/test-sheet/{spreadsheet['id']}"):
+        response = sheet_client.get(path)
+        assert response.status_code == 200, f"{path} returned {response.status_code}"
+
+    datasheet_client = test_server.app.test_client()
+    response = datasheet_client.post('/api/search-datasheets', json={'wire_name': '14 AWG PVC'})
+    assert response.status_code == 200, f"search route returned {response.status_code}"
+    for file in (spreadsheet, document):
+        response = datasheet_client.post('/api/get-datasheet', json={'file_id': file['id']})
+        assert response.status_code == 200, f"get-datasheet returned {response.status_code} for {file['name']}"
+
+
+def unmasked_bytes(endpoint: str, request: dict) -> int:
+    """Size of the same response without its fields mask"""
+    params = {key: values for key, values in request['params'].items() if key != 'fields'}
+    url = endpoint + quote(request['path'])
+    if params:
+        url += '?' + urlencode(params, doseq=True)
+    with urlopen(url) as response:
+        return len(response.read())
+
+
+def main() -> int:
+    fake = FakeGoogle().start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_services(fake.url, workdir)
+            exercise(fake)
+
+            # Replaying the calls unmasked records more requests, so keep the originals apart
+            requests = list(fake.requests)
+            missing = [r for r in requests if 'fields' not in r['params']]
+            totals = defaultdict(lambda: [0, 0, 0])
+            for request in requests:
+                call = request['path']
+                for resource_id in {f['id'] for f in fake.drive.files}:
+                    call = call.replace(resource_id, '{id}')
+                call = call.split('/values/')[0] + '/values/{range}' if '/values/' in call else call
+                totals[call][0] += 1
+                totals[call][1] += request['response_bytes']
+                totals[call][2] += unmasked_bytes(fake.url, request)
+    finally:
+        fake.stop()
+
+    print(f"{'call':<45} {'count':>6} {'masked':>10} {'unmasked':>10} {'saved':>7}")
+    for call, (count, masked, unmasked) in sorted(totals.items()):
+        saved = 1 - masked / unmasked if unmasked else 0
+        print(f"{call:<45} {count:>6} {masked:>10} {unmasked:>10} {saved:>6.0%}")
+    masked = sum(t[1] for t in totals.values())
+    unmasked = sum(t[2] for t in totals.values())
+    print(f"{'total':<45} {sum(t[0] for t in totals.values()):>6} {masked:>10} {unmasked:>10} "
+          f"{1 - masked / unmasked:>6.0%}")
+
+    if missing:
+        print(f"\n❌ {len(missing)} request(s) without a fields mask:")
+        for request in missing:
+            print(f"   {request['method']} {request['path']} {json.dumps(request['params'])}")
+        return 1
+    print(f"\n✅ All {len(requests)} Google API requests carried a fields mask")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""
+Local fake of the Drive v3, Sheets v4 and Docs v1 endpoints the services call.
+
+Serves a deterministic folder of datasheet spreadsheets and documents,
+applies ``fields`` partial-response masks the way Google does, and records
+every request (path, parameters, response size) so harnesses can assert on
+them. Point the services at it with GOOGLE_API_ENDPOINT:
+
+    python benchmarks/fake_google.py --port 8099
+    GOOGLE_API_ENDPOINT=http://127.0.0.1:8099 python test_server.py
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+FOLDER_ID = '1Kov8AGSLwywk28rBgr9HaFVzCMwdQnJN'
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+DOCUMENT_MIME_TYPE = 'application/vnd.google-apps.document'
+
+WIRE_TYPES = ['12 AWG XLPE', '14 AWG PVC', '16 AWG PTFE', '10 AWG XLPE', '18 AWG Silicone', '8 AWG EPR']
+CONDUCTORS = ['Tinned Copper', 'Bare Copper', 'Silver Plated Copper']
+INSULATIONS = ['XLPE', 'PVC', 'PTFE', 'Silicone', 'EPR']
+
+
+def parse_fields(mask: str) -> Dict:
+    """Parse a partial-response mask ('a.b(c,d(e)),f') into a nested dict of selected keys"""
+    tree: Dict = {}
+    position = 0
+
+    def parse_list(node: Dict) -> None:
+        nonlocal position
+        while position < len(mask):
+            start = position
+            while position < len(mask) and mask[position] not in ',()':
+                position += 1
+            path = mask[start:position].strip()
+            current = node
+            for part in path.split('.'):
+                current = current.setdefault(part, {})
+            if position < len(mask) and mask[position] == '(':
+                position += 1
+                parse_list(current)
+                position += 1  # ')'
+            if position < len(mask) and mask[position] == ',':
+                position += 1
+                continue
+            return
+
+    parse_list(tree)
+    return tree
+
+
+def apply_fields(value, tree: Dict):
+    """Keep only the fields selected by a parsed mask (lists are filtered element-wise)"""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: apply_fields(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+def column_number(letters: str) -> int:
+    number = 0
+    for letter in letters.upper():
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def parse_a1(a1: str) -> Tuple[str, int, int, Optional[int], Optional[int]]:
+    """Split "'Tab'!A1:C10" into (title, first row, first column, last row, last column), 1-based"""
+    title, _, cells = a1.rpartition('!')
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    match = re.fullmatch(r'([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?', cells.upper())
+    if not match:
+        raise ValueError(f"Unsupported range {a1}")
+    first_column = column_number(match.group(1))
+    first_row = int(match.group(2) or 1)
+    last_column = column_number(match.group(3)) if match.group(3) else first_column
+    last_row = int(match.group(4)) if match.group(4) else None
+    return title, first_row, first_column, last_row, last_column
+
+
+def configure_services(endpoint: str, workdir: str):
+    """
+    Point the services at a fake backend; call before importing them
+
+    Args:
+        endpoint: Root URL of the fake API
+        workdir: Scratch directory for the cache database and snapshots
+    """
+    os.environ['GOOGLE_API_ENDPOINT'] = endpoint
+    os.environ['DRIVE_CACHE_DB'] = os.path.join(workdir, 'drive_cache.sqlite3')
+    os.environ['DATASHEET_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+    os.environ['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+    os.environ['DATASHEET_WARMUP_INTERVAL'] = '0'
+    # The local quotas would otherwise dominate every timing
+    for api in ('DRIVE', 'SHEETS', 'DOCS'):
+        os.environ.setdefault(f'{api}_REQUESTS_PER_MINUTE', '1000000')
+        os.environ.setdefault(f'{api}_BURST', '1000')
+
+
+class FakeDrive:
+    """Deterministic folder contents"""
+
+    def __init__(self, spreadsheets: int = 30, documents: int = 5, tabs: int = 1, rows: int = 300,
+                 wide_columns: int = 40, seed: int = 7):
+        rng = random.Random(seed)
+        self.files: List[Dict] = []
+        self.spreadsheets: Dict[str, Dict] = {}
+        self.documents: Dict[str, Dict] = {}
+        base = time.time()
+
+        for i in range(spreadsheets):
+            wire = WIRE_TYPES[i % len(WIRE_TYPES)]
+            name = f"Production Datasheet {wire} Rev {i // len(WIRE_TYPES) + 1}"
+            if i % 10 == 0:
+                name = f"Standard Technical Datasheet {wire}"
+            file_id = f"sheet{i:04d}"
+            self.files.append(self._file(file_id, name, SPREADSHEET_MIME_TYPE, base - i * 86400))
+            self.spreadsheets[file_id] = self._spreadsheet(file_id, name, wire, rng, tabs, rows, wide_columns)
+
+        for i in range(documents):
+            wire = WIRE_TYPES[i % len(WIRE_TYPES)]
+            file_id = f"doc{i:04d}"
+            self.files.append(self._file(file_id, f"Cable Specification {wire}", DOCUMENT_MIME_TYPE,
+                                         base - (spreadsheets + i) * 86400))
+            self.documents[file_id] = self._document(file_id, wire, rng)
+
+    @staticmethod
+    def _file(file_id: str, name: str, mime_type: str, modified: float) -> Dict:
+        return {
+            'kind': 'drive#file',
+            'id': file_id,
+            'name': name,
+            'mimeType': mime_type,
+            'modifiedTime': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(modified)),
+            'size': '0',
+            'parents': [FOLDER_ID],
+            'trashed': False,
+            'owners': [{'displayName': 'Paras Wires', 'emailAddress': 'datasheets@example.com'}],
+            'permissions': [{'role': 'owner', 'type': 'user'}],
+            'capabilities': {'canEdit': True, 'canComment': True, 'canShare': True},
+        }
+
+    @staticmethod
+    def _spreadsheet(file_id: str, name: str, wire: str, rng: random.Random, tabs: int, rows: int,
+                     wide_columns: int) -> Dict:
+        awg, _, insulation = wire.partition(' AWG ')
+        technical = [
+            ['Parameter', 'Value', 'Unit'],
+            ['Product Name', f"{wire} Hook-up Wire", ''],
+            ['Conductor Type', rng.choice(CONDUCTORS), ''],
+            ['AWG Size', awg, 'AWG'],
+            ['Insulation Type', insulation, ''],
+            ['Voltage Rating', str(rng.choice([300, 600, 1000])), 'V'],
+            ['Temperature Rating', '-40 to +125', '°C'],
+            ['Standards', 'DEF STAN 61-12', ''],
+            ['Outer Diameter', f"{rng.uniform(1.5, 9):.2f}", 'mm'],
+            ['Weight', f"{rng.uniform(5, 200):.1f}", 'kg/km'],
+        ]
+        header = [f"Measurement {c + 1}" for c in range(wide_columns)]
+        grids = [('Technical Specification', technical, 200, 26)]
+        for tab in range(tabs):
+            production = [header] + [
+                [f"{rng.uniform(0, 1000):.2f}" for _ in range(wide_columns)] for _ in range(rows)
+            ]
+            title = 'Production Data' if tab == 0 else f"Production Data {tab + 1}"
+            grids.append((title, production, rows + 700, wide_columns))
+        sheets = []
+        for index, (title, values, row_count, column_count) in enumerate(grids):
+            sheets.append({
+                'properties': {
+                    'sheetId': index * 1000 + 1,
+                    'title': title,
+                    'index': index,
+                    'sheetType': 'GRID',
+                    'gridProperties': {'rowCount': row_count, 'columnCount': column_count, 'frozenRowCount': 1},
+                    'tabColorStyle': {'rgbColor': {'red': 0.2, 'green': 0.4, 'blue': 0.8}},
+                },
+                'conditionalFormats': [{
+                    'ranges': [{'sheetId': index * 1000 + 1, 'startRowIndex': 1, 'endRowIndex': row_count}],
+                    'booleanRule': {'condition': {'type': 'NUMBER_GREATER', 'values': [{'userEnteredValue': '500'}]},
+                                    'format': {'backgroundColor': {'red': 1, 'green': 0.8, 'blue': 0.8}}},
+                }] * 5,
+                'protectedRanges': [{'protectedRangeId': index, 'range': {'sheetId': index * 1000 + 1},
+                                     'description': 'Locked by QA', 'warningOnly': True}],
+                'values': values,
+            })
+        sheets.append({'properties': {'sheetId': 9001, 'title': 'Trend Chart', 'index': len(grids),
+                                      'sheetType': 'OBJECT'},
+                       'charts': [{'chartId': 1, 'spec': {'title': 'Trend'}}]})
+        return {
+            'spreadsheetId': file_id,
+            'properties': {'title': name, 'locale': 'en_GB', 'timeZone': 'Asia/Kolkata',
+                           'defaultFormat': {'textFormat': {'fontFamily': 'Arial', 'fontSize': 10}}},
+            'sheets': sheets,
+            'namedRanges': [{'namedRangeId': f"nr{i}", 'name': f"Range{i}",
+                             'range': {'sheetId': 1, 'startRowIndex': i, 'endRowIndex': i + 1}} for i in range(20)],
+            'spreadsheetUrl': f"https://docs.google.com/spreadsheets/d/{file_id}/edit",
+        }
+
+    @staticmethod
+    def _document(file_id: str, wire: str, rng: random.Random) -> Dict:
+        lines = [f"Cable Specification {wire}\n", f"Conductor Type: {rng.choice(CONDUCTORS)}\n",
+                 f"Voltage Rating: {rng.choice([300, 600, 1000])} V\n"] + [
+            f"Clause {i}: Test requirement {rng.randint(1, 999)} per DEF STAN 61-12.\n" for i in range(200)]
+        style = {'bold': False, 'italic': False, 'fontSize': {'magnitude': 11, 'unit': 'PT'},
+                 'weightedFontFamily': {'fontFamily': 'Arial', 'weight': 400},
+                 'foregroundColor': {'color': {'rgbColor': {'red': 0, 'green': 0, 'blue': 0}}}}
+        content = [{'startIndex': 0, 'endIndex': 1, 'sectionBreak': {'sectionStyle': {'columnSeparatorStyle': 'NONE'}}}]
+        for line in lines:
+            content.append({'paragraph': {
+                'elements': [{'startIndex': 1, 'endIndex': 1 + len(line), 'textRun': {'content': line, 'textStyle': style}}],
+                'paragraphStyle': {'namedStyleType': 'NORMAL_TEXT', 'direction': 'LEFT_TO_RIGHT',
+                                   'spaceAbove': {'magnitude': 6, 'unit': 'PT'}, 'lineSpacing': 115},
+            }})
+        return {'documentId': file_id, 'title': f"Cable Specification {wire}", 'body': {'content': content},
+                'documentStyle': {'pageSize': {'height': {'magnitude': 842, 'unit': 'PT'}}},
+                'namedStyles': {'styles': [{'namedStyleType': 'NORMAL_TEXT', 'textStyle': style}] * 10},
+                'revisionId': 'rev-1'}
+
+    def query(self, q: str) -> List[Dict]:
+        files = [file for file in self.files if not file['trashed']]
+        parent = re.search(r"'([^']+)' in parents", q)
+        if parent:
+            files = [file for file in files if parent.group(1) in file['parents']]
+        mime_type = re.search(r"mimeType\s*=\s*'([^']+)'", q)
+        if mime_type:
+            files = [file for file in files if file['mimeType'] == mime_type.group(1)]
+        contains = re.findall(r"name contains '([^']+)'", q)
+        if contains:
+            files = [file for file in files if any(text in file['name'] for text in contains)]
+        return files
+
+    def values(self, spreadsheet_id: str, a1: str) -> Dict:
+        title, first_row, first_column, last_row, last_column = parse_a1(a1)
+        for sheet in self.spreadsheets[spreadsheet_id]['sheets']:
+            # A range without a sheet title refers to the first sheet
+            if sheet['properties']['title'] == title or not title:
+                break
+        else:
+            raise KeyError(f"Unable to parse range: {a1}")
+        if 'values' not in sheet:
+            raise KeyError(f"Unable to parse range: {a1}")
+        rows = sheet['values'][first_row - 1:last_row]
+        rows = [row[first_column - 1:last_column] for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        value_range = {'range': a1, 'majorDimension': 'ROWS'}
+        if rows:
+            value_range['values'] = rows
+        return value_range
+
+
+class FakeGoogle:
+    """
+    Threaded HTTP server answering the Google API calls made by the services
+
+    Attributes:
+        requests: Every request served, as dicts with method, path, params and response_bytes
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, **drive_options):
+        self.drive = FakeDrive(**drive_options)
+        self.latency = latency
+        self.requests: List[Dict] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeGoogle':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-google', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+
+    def _record(self, entry: Dict):
+        with self._lock:
+            self.requests.append(entry)
+
+    def route(self, path: str, params: Dict[str, List[str]]) -> Tuple[int, Dict]:
+        drive = self.drive
+        if path == '/drive/v3/files':
+            files = drive.query(params.get('q', [''])[0])
+            page_size = int(params.get('pageSize', ['100'])[0])
+            start = int(params.get('pageToken', ['0'])[0])
+            body = {'kind': 'drive#fileList', 'incompleteSearch': False, 'files': files[start:start + page_size]}
+            if start + page_size < len(files):
+                body['nextPageToken'] = str(start + page_size)
+            return 200, body
+        if path == '/drive/v3/changes/startPageToken':
+            return 200, {'kind': 'drive#startPageToken', 'startPageToken': '1'}
+        if path == '/drive/v3/changes':
+            return 200, {'kind': 'drive#changeList', 'newStartPageToken': '1', 'changes': []}
+        match = re.fullmatch(r'/drive/v3/files/([^/]+)', path)
+        if match:
+            for file in drive.files:
+                if file['id'] == match.group(1):
+                    return 200, file
+            return 404, {}
+        match = re.fullmatch(r'/v4/spreadsheets/([^/]+)/values:batchGet', path)
+        if match:
+            spreadsheet_id = match.group(1)
+            return 200, {'spreadsheetId': spreadsheet_id,
+                         'valueRanges': [drive.values(spreadsheet_id, a1) for a1 in params.get('ranges', [])]}
+        match = re.fullmatch(r'/v4/spreadsheets/([^/]+)/values/(.+)', path)
+        if match:
+            return 200, drive.values(match.group(1), match.group(2))
+        match = re.fullmatch(r'/v4/spreadsheets/([^/]+)', path)
+        if match and match.group(1) in drive.spreadsheets:
+            spreadsheet = drive.spreadsheets[match.group(1)]
+            # Cell data is only part of the resource with includeGridData
+            return 200, dict(spreadsheet, sheets=[{key: value for key, value in sheet.items() if key != 'values'}
+                                                  for sheet in spreadsheet['sheets']])
+        match = re.fullmatch(r'/v1/documents/([^/]+)', path)
+        if match and match.group(1) in drive.documents:
+            return 200, drive.documents[match.group(1)]
+        return 404, {}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes; with Nagle each response would wait for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = unquote(url.path)
+                params = parse_qs(url.query)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                try:
+                    status, body = fake.route(path, params)
+                except KeyError as e:
+                    status, body = 400, {'error': {'code': 400, 'message': str(e), 'errors': [{'reason': 'badRequest'}]}}
+                if status == 404 and not body:
+                    body = {'error': {'code': 404, 'message': 'Not found', 'errors': [{'reason': 'notFound'}]}}
+                if status == 200 and 'fields' in params:
+                    body = apply_fields(body, parse_fields(params['fields'][0]))
+                payload = json.dumps(body).encode('utf-8')
+                fake._record({'method': 'GET', 'path': path, 'params': params, 'status': status,
+                              'response_bytes': len(payload)})
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local fake of the Google APIs')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--spreadsheets', type=int, default=30)
+    parser.add_argument('--documents', type=int, default=5)
+    parser.add_argument('--tabs', type=int, default=1, help='Production data tabs per spreadsheet')
+    parser.add_argument('--rows', type=int, default=300, help='Rows per production data tab')
+    args = parser.parse_args()
+
+    server = FakeGoogle(port=args.port, latency=args.latency, spreadsheets=args.spreadsheets,
+                        documents=args.documents, tabs=args.tabs, rows=args.rows)
+    print(f"🧪 Fake Google APIs on {server.url} ({len(server.drive.files)} files in folder {FOLDER_ID})")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,317 @@
+"""
+End-to-end load test of the Flask apps on a local fake Google backend.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --concurrency 1 4 16 64 --duration 20 --workers 4
+    python benchmarks/load_test.py --datasheets-url http://host:5000 --sheets-url http://host:5001
+
+Starts the fake API, then test_server.py and Google_Sheet.py under
+serve.py, all pointed at the fake. (With --datasheets-url and --sheets-url
+it drives servers that are already running instead.) It replays a request
+mix of /api/search-datasheets, /api/integrate-datasheet and /sheet-data at
+increasing numbers of concurrent clients. Each client sends its next
+request as soon as the previous one completes. Wire names are drawn from a
+Zipf-skewed popularity ranking, like real traffic where a few cables make
+up most requests. For every concurrency level it reports throughput,
+p50/p95/p99 latency and the error rate per endpoint. It also names the
+first level at which p99 degrades beyond ``--degrade-factor`` times the
+lowest level's p99.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_google import WIRE_TYPES, configure_services  # noqa: E402
+
+# How clients spell the wire names, most popular first (ranked for the Zipf draw)
+WIRE_SPELLINGS = [spelling for wire in WIRE_TYPES for spelling in (
+    wire, f"{wire} Cable", wire.replace(' AWG', 'AWG'), f"{wire.lower()} wire")]
+# Wire names no datasheet matches
+UNKNOWN_WIRES = ['Multi-core Shielded Cable', 'Coaxial RG58', '4 Core Armoured']
+
+REPORT_DATA = {
+    'standard_name': 'DEF STAN 61-12',
+    'itemDescription': '',
+    'conductor_type': '',
+    'insulation_type': '',
+    'customer': 'Load Test',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the Flask apps against a fake Google backend')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help='Concurrent clients of each stage')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per concurrency level')
+    parser.add_argument('--mix', default='search=0.6,integrate=0.3,sheet-data=0.1',
+                        help='Request mix as endpoint=weight pairs')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of the wire-name popularity')
+    parser.add_argument('--unknown-share', type=float, default=0.05, help='Share of requests for unknown wires')
+    parser.add_argument('--degrade-factor', type=float, default=2.0,
+                        help='p99 growth over the first level that counts as degraded')
+    parser.add_argument('--timeout', type=float, default=60, help='Client timeout per request (seconds)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    group = parser.add_argument_group('servers started by the load test')
+    group.add_argument('--workers', type=int, default=2, help='serve.py worker processes per app')
+    group.add_argument('--threads', type=int, default=8, help='serve.py threads per worker')
+    group.add_argument('--spreadsheets', type=int, default=30, help='Spreadsheets in the fake folder')
+    group.add_argument('--rows', type=int, default=300, help='Rows per production data tab')
+    group.add_argument('--latency', type=float, default=0.05, help='Seconds added to every fake API response')
+    group = parser.add_argument_group('servers already running')
+    group.add_argument('--datasheets-url', help='Base URL of a running test_server.py')
+    group.add_argument('--sheets-url', help='Base URL of a running Google_Sheet.py')
+    return parser.parse_args()
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('search', 'integrate', 'sheet-data'):
+            raise SystemExit(f"Unknown endpoint in --mix: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+class WireNames:
+    """Zipf-distributed wire names, with a share of names that match nothing"""
+
+    def __init__(self, exponent: float, unknown_share: float, rng: random.Random):
+        self.names = WIRE_SPELLINGS
+        self.weights = [1 / rank ** exponent for rank in range(1, len(self.names) + 1)]
+        self.unknown_share = unknown_share
+        self.rng = rng
+
+    def draw(self) -> str:
+        if self.rng.random() < self.unknown_share:
+            return self.rng.choice(UNKNOWN_WIRES)
+        return self.rng.choices(self.names, self.weights)[0]
+
+
+# --- Servers ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with status {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_servers(args, workdir: str) -> Tuple[str, str, List[subprocess.Popen]]:
+    """Start the fake backend and both apps; returns their base URLs and the processes"""
+    log = open(os.path.join(workdir, 'servers.log'), 'w')
+    fake_port, datasheets_port, sheets_port = _free_port(), _free_port(), _free_port()
+    processes = []
+
+    fake = subprocess.Popen([sys.executable, os.path.join(BENCHMARKS_DIR, 'fake_google.py'),
+                             '--port', str(fake_port), '--latency', str(args.latency),
+                             '--spreadsheets', str(args.spreadsheets), '--rows', str(args.rows)],
+                            stdout=log, stderr=subprocess.STDOUT)
+    processes.append(fake)
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    _wait_until_up(fake_url, fake)
+
+    # Both apps share one cache database, as in production
+    saved_environ = dict(os.environ)
+    configure_services(fake_url, workdir)
+    env = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(saved_environ)
+
+    for app, port in (('datasheets', datasheets_port), ('sheets', sheets_port)):
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, 'serve.py'), '--app', app, '--host', '127.0.0.1',
+             '--port', str(port), '--workers', str(args.workers), '--threads', str(args.threads)],
+            cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT))
+
+    datasheets_url = f"http://127.0.0.1:{datasheets_port}"
+    sheets_url = f"http://127.0.0.1:{sheets_port}"
+    _wait_until_up(f"{datasheets_url}/api/health", processes[1])
+    _wait_until_up(f"{sheets_url}/test", processes[2])
+    print(f"🧪 Fake backend {fake_url}, datasheet API {datasheets_url}, sheet API {sheets_url} "
+          f"({args.workers} worker(s) x {args.threads} thread(s) each); logs in {log.name}")
+    return datasheets_url, sheets_url, processes
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# --- Load generation ---
+
+class Client(threading.Thread):
+    """One closed-loop client: sends the next request as soon as the previous one completes"""
+
+    def __init__(self, datasheets_url: str, sheets_url: str, mix: Dict[str, float], seed: int,
+                 exponent: float, unknown_share: float, timeout: float, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.datasheets_url = datasheets_url
+        self.sheets_url = sheets_url
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.wire_names = WireNames(exponent, unknown_share, self.rng)
+        self.timeout = timeout
+        self.stop = stop
+        self.session = requests.Session()
+        # (endpoint, seconds, ok)
+        self.samples: List[Tuple[str, float, bool]] = []
+
+    def request(self, endpoint: str) -> requests.Response:
+        if endpoint == 'search':
+            return self.session.post(f"{self.datasheets_url}/api/search-datasheets",
+                                     json={'wire_name': self.wire_names.draw()}, timeout=self.timeout)
+        if endpoint == 'integrate':
+            return self.session.post(f"{self.datasheets_url}/api/integrate-datasheet",
+                                     json={'wire_name': self.wire_names.draw(), 'report_data': REPORT_DATA},
+                                     timeout=self.timeout)
+        return self.session.get(f"{self.sheets_url}/sheet-data", timeout=self.timeout)
+
+    def run(self):
+        while not self.stop.is_set():
+            endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                response = self.request(endpoint)
+                # An unknown wire is an expected 404, not a server error
+                ok = response.status_code < 500
+                response.content  # the whole body is part of the latency
+            except requests.RequestException:
+                ok = False
+            self.samples.append((endpoint, time.perf_counter() - start, ok))
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))]
+
+
+def summarize(samples: List[Tuple[str, float, bool]], elapsed: float) -> Dict[str, Dict]:
+    by_endpoint: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+    for endpoint, seconds, ok in samples:
+        by_endpoint[endpoint].append((seconds, ok))
+        by_endpoint['all'].append((seconds, ok))
+
+    summary = {}
+    for endpoint, values in by_endpoint.items():
+        latencies = sorted(seconds for seconds, _ in values)
+        errors = sum(1 for _, ok in values if not ok)
+        summary[endpoint] = {
+            'requests': len(values),
+            'throughput': len(values) / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'error_rate': errors / len(values),
+        }
+    return summary
+
+
+def run_stage(args, datasheets_url: str, sheets_url: str, mix: Dict[str, float], concurrency: int,
+              stage: int) -> Dict[str, Dict]:
+    stop = threading.Event()
+    clients = [Client(datasheets_url, sheets_url, mix, args.seed * 1000 + stage * 100 + i, args.zipf,
+                      args.unknown_share, args.timeout, stop) for i in range(concurrency)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    time.sleep(args.duration)
+    stop.set()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    return summarize([sample for client in clients for sample in client.samples], elapsed)
+
+
+def print_stage(concurrency: int, summary: Dict[str, Dict]):
+    print(f"\nConcurrency {concurrency}")
+    print(f"  {'endpoint':<12} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint in sorted(summary, key=lambda name: (name == 'all', name)):
+        stats = summary[endpoint]
+        print(f"  {endpoint:<12} {stats['requests']:>9} {stats['throughput']:>8.1f} {stats['p50'] * 1000:>9.1f} "
+              f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f} {stats['error_rate']:>6.1%}")
+
+
+def main() -> int:
+    args = parse_args()
+    mix = parse_mix(args.mix)
+    if args.datasheets_url and not args.sheets_url and 'sheet-data' in mix:
+        raise SystemExit('--sheets-url is required with --datasheets-url when the mix includes sheet-data')
+
+    processes = []
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if args.datasheets_url:
+                datasheets_url, sheets_url = args.datasheets_url.rstrip('/'), (args.sheets_url or '').rstrip('/')
+            else:
+                datasheets_url, sheets_url, processes = start_servers(args, workdir)
+
+            results = []
+            baseline_p99: Optional[float] = None
+            degraded_at: Optional[int] = None
+            for stage, concurrency in enumerate(args.concurrency):
+                summary = run_stage(args, datasheets_url, sheets_url, mix, concurrency, stage)
+                print_stage(concurrency, summary)
+                results.append({'concurrency': concurrency, 'endpoints': summary})
+
+                p99 = summary['all']['p99']
+                if baseline_p99 is None:
+                    baseline_p99 = p99
+                elif degraded_at is None and p99 > args.degrade_factor * baseline_p99:
+                    degraded_at = concurrency
+        finally:
+            stop_servers(processes)
+
+    best = max(results, key=lambda result: result['endpoints']['all']['throughput'])
+    print(f"\nPeak throughput {best['endpoints']['all']['throughput']:.1f} req/s at concurrency {best['concurrency']}")
+    if degraded_at is not None:
+        print(f"⚠️ p99 degraded beyond {args.degrade_factor:g}x the concurrency-{args.concurrency[0]} p99 "
+              f"({baseline_p99 * 1000:.0f} ms) at concurrency {degraded_at}")
+    else:
+        print(f"✅ p99 stayed within {args.degrade_factor:g}x of {baseline_p99 * 1000:.0f} ms at every level")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'arguments': vars(args), 'stages': results, 'degraded_at': degraded_at}, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
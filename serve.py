@@ -0,0 +1,120 @@
+"""
+Production entry point for the Flask apps
+
+    python serve.py --app datasheets --port 5000 --workers 2 --threads 8
+
+Runs the app under gunicorn's pre-fork server instead of the Flask
+development server. Worker processes share the folder index and the
+extracted-datasheet cache through the SQLite store (drive_cache.sqlite3)
+and the Google access token through token.json; only a small in-memory
+cache is kept per worker. The Google API quotas are token buckets in the
+same store, shared by every worker of both apps.
+
+gunicorn does not run on Windows; there the app falls back to Flask's
+threaded server in a single process.
+"""
+import argparse
+import os
+import tempfile
+from typing import Optional
+
+# Flask app served by each --app choice
+APPS = {
+    'datasheets': 'test_server:app',   # datasheet search / report API
+    'sheets': 'Google_Sheet:app',      # /sheet-data and /list-sheets
+}
+
+
+# Started in every worker after the app is loaded
+WORKER_STARTUP = {
+    'datasheets': 'Datasheet_Warmup:start_warmup_scheduler',
+}
+
+
+def _resolve(uri: str):
+    module_name, attribute = uri.split(':')
+    return getattr(__import__(module_name), attribute)
+
+
+def run_gunicorn(app_uri: str, options: dict, startup: Optional[str] = None):
+    """Run a WSGI app under gunicorn with options given in code rather than on its command line"""
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.util import import_app
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Imported in each worker, so no app state or thread is inherited through fork
+            app = import_app(app_uri)
+            if startup:
+                _resolve(startup)()
+            return app
+
+    Server().run()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serve the Paras Wires API with a multi-worker WSGI server')
+    parser.add_argument('--app', choices=sorted(APPS), default='datasheets', help='Which app to serve')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', '2')),
+                        help='Worker processes (default: $WEB_CONCURRENCY or 2)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', '8')),
+                        help='Request threads per worker (default: $WEB_THREADS or 8)')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WEB_TIMEOUT', '120')),
+                        help='Seconds before a silent worker is restarted (default: $WEB_TIMEOUT or 120)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workers = max(1, args.workers)
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        gunicorn = None
+        workers = 1
+
+    # Read by Google_Client and Drive_Cache at import time in every worker
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    # Each served app sums only its own workers' metrics
+    metrics_root = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'paras_wires_metrics'))
+    os.environ['METRICS_DIR'] = os.path.join(metrics_root, f"{args.app}-{args.port}")
+
+    # Workers publish their metrics here; drop the ones of earlier runs
+    from Metrics import clear_published_metrics
+    clear_published_metrics()
+
+    # Load (or create) token.json once before forking, so no worker starts the OAuth flow
+    from Google_Client import get_credentials
+    get_credentials()
+
+    app_uri = APPS[args.app]
+    startup = WORKER_STARTUP.get(args.app)
+    print(f"🚀 Serving {app_uri} on {args.host}:{args.port} with {workers} worker(s) x {args.threads} thread(s)")
+
+    if gunicorn is None:
+        print("⚠️ gunicorn is not available on this platform, falling back to Flask's threaded server")
+        app = _resolve(app_uri)
+        if startup:
+            _resolve(startup)()
+        app.run(host=args.host, port=args.port, threaded=True, debug=False)
+        return
+
+    run_gunicorn(app_uri, {
+        'bind': f"{args.host}:{args.port}",
+        'workers': workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'accesslog': '-',
+    }, startup)
+
+
+if __name__ == '__main__':
+    main()
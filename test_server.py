@@ -1,20 +1,68 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 import json
+import math
 from Google_Drive import (
     authenticate, 
-    get_latest_production_datasheet, 
+    extract_datasheet_data,
+    generate_batch_reports,
+    get_datasheet_file,
     integrate_datasheet_into_report,
-    search_production_datasheets_by_wire_name
+    search_production_datasheets_by_wire_name,
+    track_wire_request
 )
+from Datasheet_Warmup import start_warmup_scheduler
+import time
 import traceback
 from datetime import datetime
+from Google_Client import api_call_stats
+from Http_Cache import files_etag, not_modified, with_etag
+from Metrics import instrument_app
+from Profiler import install_profiler
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend integration
+# Per-request latency, Google API and cache metrics on GET /metrics
+instrument_app(app)
+# Opt-in sampling profiles of single requests (see Profiler.py)
+install_profiler(app)
+
+# Most candidate datasheets a single request may extract concurrently
+MAX_CANDIDATES = 10
+# Longest deadline_seconds a request may ask for
+MAX_DEADLINE_SECONDS = 3600
+# Most reports a single batch request may generate
+MAX_BATCH_REPORTS = 1000
+
+def parse_candidate_options(data):
+    """Read the optional concurrent-extraction parameters from a request body"""
+    candidates = data.get('candidates', 1)
+    deadline = data.get('deadline_seconds')
+    
+    # JSON numbers or numeric strings only; 2.7 candidates is an error, not 2
+    if isinstance(candidates, bool) or not isinstance(candidates, (int, str)):
+        raise ValueError('candidates must be an integer')
+    try:
+        candidates = int(candidates)
+    except ValueError:
+        raise ValueError('candidates must be an integer')
+    if not 1 <= candidates <= MAX_CANDIDATES:
+        raise ValueError(f'candidates must be between 1 and {MAX_CANDIDATES}')
+    
+    if deadline is not None:
+        if isinstance(deadline, bool) or not isinstance(deadline, (int, float, str)):
+            raise ValueError('deadline_seconds must be a number')
+        try:
+            deadline = float(deadline)
+        except ValueError:
+            raise ValueError('deadline_seconds must be a number')
+        # "inf", "nan" and "1e400" parse as floats but cannot be waited on
+        if not math.isfinite(deadline) or not 0 < deadline <= MAX_DEADLINE_SECONDS:
+            raise ValueError(f'deadline_seconds must be positive and at most {MAX_DEADLINE_SECONDS}')
+    return candidates, deadline
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -22,7 +70,8 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'message': 'Google Drive Integration API is running',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'google_api': api_call_stats()
     })
 
 @app.route('/api/search-datasheets', methods=['POST'])
@@ -39,6 +88,7 @@ def search_datasheets():
             }), 400
         
         print(f"🔍 Frontend request: Searching for datasheets for wire '{wire_name}'")
+        track_wire_request(wire_name)
         
         # Authenticate with Google Drive
         creds = authenticate()
@@ -83,14 +133,15 @@ def search_datasheets():
             'error': f'Failed to search datasheets: {str(e)}'
         }), 500
 
-@app.route('/api/get-datasheet', methods=['POST'])
-def get_datasheet():
-    """Get full datasheet data for a specific file"""
+def datasheet_response(file_id: str, conditional: bool):
+    """
+    Build the datasheet response for a specific file
+    
+    Args:
+        file_id: Google Drive file ID
+        conditional: Tag the response and answer a matching If-None-Match with 304 (GET only)
+    """
     try:
-        data = request.get_json()
-        file_id = data.get('file_id', '').strip()
-        wire_name = data.get('wire_name', '').strip()
-        
         if not file_id:
             return jsonify({
                 'success': False,
@@ -102,13 +153,23 @@ def get_datasheet():
         # Authenticate with Google Drive
         creds = authenticate()
         
-        # Get the datasheet data
-        datasheet_data = get_latest_production_datasheet(wire_name, creds)
+        # Fetch exactly the requested file, without searching the folder
+        file_info = get_datasheet_file(file_id, creds)
+        
+        # An unchanged file needs neither extraction nor serialization
+        etag = None
+        if file_info and conditional:
+            etag = files_etag([file_info], 'get-datasheet')
+            cached_response = not_modified(etag)
+            if cached_response is not None:
+                return cached_response
+        
+        datasheet_data = extract_datasheet_data(file_info, creds) if file_info else None
         
         if not datasheet_data:
             return jsonify({
                 'success': False,
-                'error': f'Failed to extract datasheet data for wire: {wire_name}'
+                'error': f'Failed to extract datasheet data for file ID: {file_id}'
             }), 404
         
         # Prepare response data (exclude large DataFrames for JSON serialization)
@@ -128,7 +189,7 @@ def get_datasheet():
                     'row_count': sheet_data['row_count'],
                     'column_count': sheet_data['column_count'],
                     'headers': sheet_data['headers'],
-                    'summary': sheet_data['summary']
+                    'summary': datasheet_data.get('summary', {}).get(sheet_name, {})
                 }
         
         # Add document content if available
@@ -138,11 +199,12 @@ def get_datasheet():
                 'full_length': datasheet_data['content_length']
             }
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'message': f'Successfully retrieved datasheet data for {datasheet_data["file_name"]}',
             'datasheet': response_data
         })
+        return with_etag(response, etag) if etag else response
         
     except Exception as e:
         print(f"❌ Error in get_datasheet: {str(e)}")
@@ -152,6 +214,18 @@ def get_datasheet():
             'error': f'Failed to get datasheet: {str(e)}'
         }), 500
 
+@app.route('/api/get-datasheet', methods=['POST'])
+def get_datasheet():
+    """Get full datasheet data for a specific file"""
+    data = request.get_json(silent=True) or {}
+    # Never answered with 304: that is only allowed for GET and HEAD (RFC 9110 13.1.2)
+    return datasheet_response(str(data.get('file_id', '')).strip(), conditional=False)
+
+@app.route('/api/datasheets/<file_id>', methods=['GET'])
+def get_datasheet_by_id(file_id):
+    """Get full datasheet data for a specific file; If-None-Match is answered with 304 while it is unchanged"""
+    return datasheet_response(file_id.strip(), conditional=True)
+
 @app.route('/api/integrate-datasheet', methods=['POST'])
 def integrate_datasheet():
     """Integrate datasheet data into a report"""
@@ -172,13 +246,23 @@ def integrate_datasheet():
                 'error': 'Report data is required'
             }), 400
         
+        try:
+            candidates, deadline = parse_candidate_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         print(f"🔗 Frontend request: Integrating datasheet for wire '{wire_name}' into report")
+        track_wire_request(wire_name)
         
         # Authenticate with Google Drive
         creds = authenticate()
         
         # Integrate datasheet into report
-        enhanced_report = integrate_datasheet_into_report(wire_name, report_data, creds)
+        enhanced_report = integrate_datasheet_into_report(wire_name, report_data, creds,
+                                                          candidates=candidates, deadline=deadline)
         
         return jsonify({
             'success': True,
@@ -209,7 +293,16 @@ def auto_generate_report():
                 'error': 'Wire name is required'
             }), 400
         
+        try:
+            candidates, deadline = parse_candidate_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         print(f"🚀 Frontend request: Auto-generating report for wire '{wire_name}' with standard '{standard_name}'")
+        track_wire_request(wire_name)
         
         # Authenticate with Google Drive
         creds = authenticate()
@@ -225,7 +318,8 @@ def auto_generate_report():
         
         # Try to integrate datasheet data
         try:
-            enhanced_report = integrate_datasheet_into_report(wire_name, base_report, creds)
+            enhanced_report = integrate_datasheet_into_report(wire_name, base_report, creds,
+                                                              candidates=candidates, deadline=deadline)
             base_report = enhanced_report
             base_report['datasheet_integration'] = 'success'
         except Exception as e:
@@ -247,6 +341,95 @@ def auto_generate_report():
             'error': f'Failed to generate report: {str(e)}'
         }), 500
 
+@app.route('/api/batch-generate-reports', methods=['POST'])
+def batch_generate_reports():
+    """Generate reports for many wires at once, streamed as NDJSON records as each one completes"""
+    data = request.get_json() or {}
+    items = data.get('reports')
+    default_standard = data.get('standard_name', 'DEF STAN 61-12')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            'success': False,
+            'error': 'reports must be a non-empty list'
+        }), 400
+    if len(items) > MAX_BATCH_REPORTS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {MAX_BATCH_REPORTS} reports per batch'
+        }), 400
+    try:
+        candidates, deadline = parse_candidate_options(data)
+        if deadline is not None:
+            raise ValueError('deadline_seconds is not supported for batches')
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    # Each item is a wire name or an object like the /api/auto-generate-report body
+    base_reports = []
+    for position, item in enumerate(items):
+        item = {'wire_name': item} if isinstance(item, str) else item
+        wire_name = item.get('wire_name', '').strip() if isinstance(item, dict) else ''
+        if not wire_name:
+            return jsonify({
+                'success': False,
+                'error': f'Wire name is required (report {position})'
+            }), 400
+        base_reports.append({
+            'wire_name': wire_name,
+            'standard_name': item.get('standard_name', default_standard),
+            'generation_time': datetime.now().isoformat(),
+            'additional_data': item.get('additional_data', {}),
+            'status': 'generated'
+        })
+    
+    print(f"📦 Frontend request: Batch-generating {len(base_reports)} reports")
+    for report in base_reports:
+        track_wire_request(report['wire_name'])
+    
+    try:
+        # Authenticate with Google Drive once for the whole batch
+        creds = authenticate()
+    except Exception as e:
+        print(f"❌ Error in batch_generate_reports: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': f'Failed to generate reports: {str(e)}'
+        }), 500
+    
+    def generate():
+        started = time.perf_counter()
+        completed = found = 0
+        yield json.dumps({'type': 'start', 'reports': len(base_reports)}) + '\n'
+        try:
+            for position, report, datasheet_found in generate_batch_reports(base_reports, creds, candidates):
+                report['datasheet_integration'] = 'success'
+                completed += 1
+                found += datasheet_found
+                yield json.dumps({
+                    'type': 'report',
+                    'index': position,
+                    'wire_name': report['wire_name'],
+                    'datasheet_found': datasheet_found,
+                    'report': report
+                }, default=str) + '\n'
+        except Exception as e:
+            print(f"❌ Error in batch_generate_reports: {str(e)}")
+            print(traceback.format_exc())
+            yield json.dumps({'type': 'error', 'error': f'Failed to generate reports: {str(e)}'}) + '\n'
+        yield json.dumps({
+            'type': 'end',
+            'reports': completed,
+            'datasheets_found': found,
+            'ms': round((time.perf_counter() - started) * 1000, 1)
+        }) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/test-connection', methods=['GET'])
 def test_connection():
     """Test Google Drive connection and authentication"""
@@ -294,6 +477,11 @@ def get_sheet_data():
                 'error': 'No production datasheets found'
             }), 404
         
+        etag = files_etag(matching_files, 'sheet-data')
+        cached_response = not_modified(etag)
+        if cached_response is not None:
+            return cached_response
+        
         # Return a sample structure that the frontend expects
         sample_data = {
             'Production Sheet': [
@@ -313,7 +501,7 @@ def get_sheet_data():
             ]
         }
         
-        return jsonify(sample_data)
+        return with_etag(jsonify(sample_data), etag)
             
     except Exception as e:
         print(f"❌ Error in get_sheet_data: {str(e)}")
@@ -335,6 +523,11 @@ def list_sheets():
         # Get available datasheets
         matching_files = search_production_datasheets_by_wire_name("production", creds)
         
+        etag = files_etag(matching_files, 'list-sheets')
+        cached_response = not_modified(etag)
+        if cached_response is not None:
+            return cached_response
+        
         sheets_info = []
         for file_info in matching_files[:5]:  # Limit to top 5
             sheets_info.append({
@@ -345,11 +538,11 @@ def list_sheets():
                 'type': 'production_datasheet'
             })
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'sheets': sheets_info,
             'total_count': len(matching_files)
-        })
+        }), etag)
         
     except Exception as e:
         print(f"❌ Error in list_sheets: {str(e)}")
@@ -366,13 +559,21 @@ if __name__ == '__main__':
     print("  GET  /api/health              - Health check")
     print("  POST /api/search-datasheets   - Search for datasheets by wire name")
     print("  POST /api/get-datasheet       - Get full datasheet data")
+    print("  GET  /api/datasheets/<id>     - Get full datasheet data (conditional with If-None-Match)")
     print("  POST /api/integrate-datasheet - Integrate datasheet into report")
     print("  POST /api/auto-generate-report - Auto-generate report with datasheet")
+    print("  POST /api/batch-generate-reports - Generate many reports, streamed as NDJSON")
     print("  GET  /api/test-connection     - Test Google Drive connection")
     print("  GET  /sheet-data              - Legacy endpoint for sheet data")
     print("  GET  /list-sheets             - Legacy endpoint for listing sheets")
+    print("  GET  /metrics                 - Prometheus metrics")
     print("=" * 60)
     
+    # Load credentials and start the background token refresh before serving
+    authenticate()
+    # Pre-extract new and popular datasheets in the background
+    start_warmup_scheduler()
+    
     app.run(debug=True, host='0.0.0.0', port=5000)
 
 